@@ -1,25 +1,58 @@
 import os
-from typing import List, Dict, Any, Optional
+import threading
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Iterator
 from langchain_openai import ChatOpenAI
 from config import ChatBotConfig
-from langchain.memory import ConversationBufferWindowMemory
+from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationalRetrievalChain, ConversationChain
 from langchain.prompts import PromptTemplate
-from langchain.schema import BaseMessage, HumanMessage, AIMessage
+from langchain.schema import BaseMessage, HumanMessage, AIMessage, SystemMessage, get_buffer_string
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 from backend.knowledge_processor import KnowledgeProcessor
 import json
+import hashlib
+import tiktoken
 from datetime import datetime
 
 
+@dataclass
+class ChatbotContext:
+    """Resources shared by every chatbot built for one worker.
+    
+    Building the standard, MCP and agent bots from one context means one
+    embedding model and one pair of HTTP connection pools instead of three.
+    """
+    openai_api_key: Optional[str] = None
+    http_client: Any = None
+    http_async_client: Any = None
+    embeddings: Any = None
+
+
 class ChatBot:
     def __init__(self, 
                  openai_api_key: Optional[str] = None,
                  model_name: str = ChatBotConfig.MODEL_NAME,
                  temperature: float = ChatBotConfig.TEMPERATURE,
-                 memory_window: int = ChatBotConfig.MEMORY_WINDOW):
-        """Initialize the ChatBot with memory and knowledge capabilities."""
+                 memory_window: int = ChatBotConfig.MEMORY_WINDOW,
+                 memory_token_budget: int = ChatBotConfig.MEMORY_TOKEN_BUDGET,
+                 http_client=None,
+                 http_async_client=None,
+                 context: Optional[ChatbotContext] = None):
+        """Initialize the ChatBot with memory and knowledge capabilities.
+        
+        http_client / http_async_client: optional shared httpx clients so the
+        LLM reuses pooled connections instead of opening its own.
+        context: shared API key, HTTP clients and embedding model; takes the
+        place of the individual arguments above.
+        """
+        embeddings = None
+        if context is not None:
+            openai_api_key = context.openai_api_key or openai_api_key
+            http_client = context.http_client
+            http_async_client = context.http_async_client
+            embeddings = context.embeddings
         
         # Set up OpenAI API key
         if openai_api_key:
@@ -27,22 +60,48 @@ class ChatBot:
         elif not os.getenv("OPENAI_API_KEY"):
             raise ValueError("OpenAI API key is required")
         
+        # Kept for subclasses that make their own async HTTP calls (tool APIs)
+        self.http_async_client = http_async_client
+        
         # Initialize LLM
         self.llm = ChatOpenAI(
             model_name=model_name,
-            temperature=temperature
+            temperature=temperature,
+            http_client=http_client,
+            http_async_client=http_async_client
         )
         
-        # Initialize memory
-        self.memory = ConversationBufferWindowMemory(
-            k=memory_window,
+        # Initialize memory. A plain buffer, since _enforce_memory_budget bounds
+        # it by turns and tokens; a k-window would slice the pinned summary off
+        self.memory = ConversationBufferMemory(
             memory_key="chat_history",
             return_messages=True,
             output_key="answer"
         )
         
+        # Memory eviction policy: the prompt template is never evicted, a
+        # pinned summary of compressed turns comes next, the most recent turns
+        # are protected, and older turns are folded into the summary
+        # oldest-first to fit the token budget
+        self.memory_window = memory_window
+        self.memory_token_budget = memory_token_budget
+        self.memory_keep_recent = ChatBotConfig.MEMORY_KEEP_RECENT
+        self.summarize_evicted = ChatBotConfig.MEMORY_SUMMARIZE_EVICTED
+        
+        # Summaries go to a cheaper model than the one answering
+        self.summary_llm = ChatOpenAI(
+            model_name=ChatBotConfig.MEMORY_SUMMARY_MODEL,
+            temperature=0,
+            http_client=http_client,
+            http_async_client=http_async_client
+        )
+        try:
+            self._token_encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            self._token_encoding = tiktoken.get_encoding("cl100k_base")
+        
         # Initialize knowledge processor
-        self.knowledge_processor = KnowledgeProcessor()
+        self.knowledge_processor = KnowledgeProcessor(embeddings=embeddings)
         
         # Initialize chains
         self._setup_chains()
@@ -52,19 +111,26 @@ class ChatBot:
         
         # Chat history for UI
         self.chat_history = []
+        
+        # Handlers run chat/memory calls in worker threads; this serializes
+        # every read-modify-write of memory and chat_history on this bot
+        self._memory_lock = threading.RLock()
+        
+        # SHA-256 fingerprints of uploads already in the knowledge base
+        self.knowledge_fingerprints = set()
     
     def _setup_chains(self):
         """Set up conversation chains for different modes."""
         
         # General conversation chain (no knowledge base)
-        general_prompt = PromptTemplate(
+        self.general_prompt = PromptTemplate(
             input_variables=["history", "input"],
             template="""You are a helpful AI assistant. Have a natural conversation with the user. Previous conversation: {history} Human: {input} Assistant:""")
         
         self.general_chain = ConversationChain(
             llm=self.llm,
             memory=self.memory,
-            prompt=general_prompt,
+            prompt=self.general_prompt,
             verbose=False
         )
         
@@ -99,12 +165,26 @@ class ChatBot:
             return True
         return False
     
-    def chat(self, user_input: str) -> Dict[str, Any]:
-        """Main chat method that handles both modes."""
+    def chat(self, user_input: str, *, mode: Optional[str] = None) -> Dict[str, Any]:
+        """Main chat method that handles both modes.
+        
+        ``mode`` is passed per call, so concurrent callers using different
+        modes don't race on switch_mode; ``current_mode`` is the default when
+        it is omitted, and is updated to the mode of each successful reply.
+        """
+        with self._memory_lock:
+            return self._chat(user_input, mode)
+    
+    def _chat(self, user_input: str, mode: Optional[str]) -> Dict[str, Any]:
+        """chat() body; the caller holds the memory lock."""
+        mode = mode or self.current_mode
         try:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
-            if self.current_mode == "knowledge" and self.knowledge_chain:
+            # Keep the prompt within budget before it is sent
+            self._enforce_memory_budget()
+            
+            if mode == "knowledge" and self.knowledge_chain:
                 # Knowledge-based chat
                 response = self.knowledge_chain({
                     "question": user_input,
@@ -150,12 +230,15 @@ class ChatBot:
                 "sources": result.get("sources", [])
             })
             
+            # Reported by /status and get_memory_summary
+            self.current_mode = result["mode"]
+            
             return result
             
         except Exception as e:
             error_result = {
                 "response": f"Sorry, I encountered an error: {str(e)}",
-                "mode": self.current_mode,
+                "mode": mode,
                 "sources": [],
                 "timestamp": timestamp,
                 "success": False,
@@ -163,14 +246,153 @@ class ChatBot:
             }
             return error_result
     
+    def stream_chat(self, user_input: str, *, mode: Optional[str] = None) -> Iterator[str]:
+        """Yield the reply in chunks as the LLM produces them.
+        
+        Knowledge mode goes through the retrieval chain and yields the whole
+        answer at once. Memory is only updated once the reply has been fully
+        consumed, so an abandoned stream leaves no half answer behind.
+        """
+        mode = mode or self.current_mode
+        if mode == "knowledge" and self.knowledge_chain:
+            yield self.chat(user_input, mode=mode)["response"]
+            return
+        
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # The lock isn't held while streaming, so an abandoned stream can't
+        # keep other requests out of memory
+        with self._memory_lock:
+            self._enforce_memory_budget()
+            history = get_buffer_string(self.memory.load_memory_variables({})[self.memory.memory_key])
+        prompt = self.general_prompt.format(history=history, input=user_input)
+        
+        parts = []
+        for chunk in self.llm.stream(prompt):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield chunk.content
+        
+        answer = "".join(parts)
+        with self._memory_lock:
+            self.memory.save_context({"input": user_input}, {"answer": answer})
+            self.chat_history.append({
+                "user": user_input,
+                "assistant": answer,
+                "mode": "general",
+                "timestamp": timestamp,
+                "sources": []
+            })
+            self.current_mode = "general"
+    
+    def record_turn(self, user_input: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a turn answered without calling chat() (e.g. a cached reply).
+        
+        Writes it to memory and the UI history so the next turn still sees it.
+        Returns a copy of result stamped with the current time.
+        """
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._memory_lock:
+            self.memory.save_context({"input": user_input}, {"answer": result["response"]})
+            self.chat_history.append({
+                "user": user_input,
+                "assistant": result["response"],
+                "mode": result["mode"],
+                "timestamp": timestamp,
+                "sources": result.get("sources", [])
+            })
+        return {**result, "timestamp": timestamp}
+    
+    @property
+    def knowledge_base_hash(self) -> str:
+        """Short digest of the uploads in the knowledge base; changes whenever documents are added."""
+        if not self.knowledge_fingerprints:
+            return "none"
+        return hashlib.md5("".join(sorted(self.knowledge_fingerprints)).encode()).hexdigest()[:16]
+    
     def get_chat_history(self) -> List[Dict[str, Any]]:
         """Get the complete chat history."""
         return self.chat_history
     
     def clear_memory(self):
         """Clear conversation memory."""
-        self.memory.clear()
-        self.chat_history = []
+        with self._memory_lock:
+            self.memory.clear()
+            self.chat_history = []
+    
+    def _count_tokens(self, messages: List[BaseMessage]) -> int:
+        """Count tokens in memory messages the way the model will see them."""
+        return sum(len(self._token_encoding.encode(m.content)) for m in messages)
+    
+    def _summarize(self, messages: List[BaseMessage]) -> SystemMessage:
+        """Condense messages (including any earlier summary) into one pinned summary message."""
+        transcript = "\n".join(f"{m.type}: {m.content}" for m in messages)
+        summary = self.summary_llm.invoke(
+            "Summarize this conversation in a few sentences, keeping names, "
+            "numbers and decisions:\n" + transcript
+        ).content
+        return SystemMessage(content=f"Summary of earlier conversation: {summary}")
+    
+    def _enforce_memory_budget(self) -> int:
+        """Evict the oldest unprotected turns until memory fits the window and token budget.
+        
+        Evicted turns are folded into the pinned summary (or dropped if
+        summarizing is disabled or fails), so the prompt stays bounded
+        without losing older context outright.
+        
+        Eviction rewrites the start of the prompt and busts the provider's
+        prompt cache, so once over budget memory is trimmed down to 75% of it.
+        The prefix then stays byte-identical for the next several turns.
+        Returns the number of messages evicted. Call with the memory lock held.
+        """
+        messages = self.memory.chat_memory.messages
+        # A pinned summary from prune_memory stays at the head
+        start = 1 if messages and isinstance(messages[0], SystemMessage) else 0
+        protected = self.memory_keep_recent * 2
+        
+        # memory_window conversation pairs at most, besides the summary
+        over_window = max(0, len(messages) - start - self.memory_window * 2)
+        
+        counts = [len(self._token_encoding.encode(m.content)) for m in messages]
+        total = sum(counts)
+        if total <= self.memory_token_budget and not over_window:
+            return 0
+        
+        target = self.memory_token_budget * 3 // 4 if total > self.memory_token_budget else total
+        evicted = 0
+        while (evicted < over_window or total > target) and len(messages) - start - evicted > protected:
+            total -= counts[start + evicted]
+            evicted += 1
+        
+        if evicted:
+            head = messages[:start]
+            if self.summarize_evicted:
+                try:
+                    head = [self._summarize(messages[:start + evicted])]
+                except Exception as e:
+                    print(f"Memory summary failed, dropping evicted turns: {e}")
+            self.memory.chat_memory.messages = head + messages[start + evicted:]
+        return evicted
+    
+    def prune_memory(self) -> Dict[str, Any]:
+        """Compress older turns into one pinned summary, keeping recent turns verbatim."""
+        with self._memory_lock:
+            messages = list(self.memory.chat_memory.messages)
+            tokens_before = self._count_tokens(messages)
+            protected = self.memory_keep_recent * 2
+            
+            if len(messages) > protected:
+                # messages[:-0] would be empty, so slice from the front instead
+                split = len(messages) - protected
+                older, recent = messages[:split], messages[split:]
+                self.memory.chat_memory.messages = [self._summarize(older)] + recent
+            
+            messages_after = list(self.memory.chat_memory.messages)
+        return {
+            "messages_before": len(messages),
+            "messages_after": len(messages_after),
+            "tokens_before": tokens_before,
+            "tokens_after": self._count_tokens(messages_after)
+        }
     
     def search_knowledge_base(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
         """Search the knowledge base directly."""
@@ -6,21 +6,47 @@ Prevents inappropriate content, sexual content, and controversial documents
 import re
 import hashlib
 import mimetypes
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import List, Dict, Tuple, Optional
 from pathlib import Path
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from openai import OpenAI
 import json
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=32)
+def _compile_terms(terms: frozenset) -> "re.Pattern":
+    """
+    Compile literal terms into one alternation, longest first
+    Cached per term set, so re-initialization and filters sharing a word
+    list reuse the same compiled matcher
+    """
+    return re.compile('|'.join(re.escape(term) for term in sorted(terms, key=lambda t: (-len(t), t))))
+
+@lru_cache(maxsize=32)
+def _compile_patterns(patterns: tuple) -> "re.Pattern":
+    """Compile regex rules into one alternation so text is scanned once"""
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+
+# Keyword sets for get_content_category, checked in order
+_CATEGORY_MATCHERS = [
+    ('question', _compile_terms(frozenset(['question', 'help', 'how', 'what', 'why']))),
+    ('appreciation', _compile_terms(frozenset(['thank', 'thanks', 'good', 'great']))),
+    ('problem_report', _compile_terms(frozenset(['problem', 'issue', 'error', 'wrong']))),
+]
+
 class ContentFilter:
     """Advanced content filtering and moderation system"""
     
-    def __init__(self, openai_api_key: Optional[str] = None):
+    def __init__(self, openai_api_key: Optional[str] = None, http_client=None):
         """Initialize content filter with various filtering methods"""
-        self.openai_client = OpenAI(api_key=openai_api_key) if openai_api_key else None
+        self.openai_client = OpenAI(api_key=openai_api_key, http_client=http_client) if openai_api_key else None
         
         # Blocked words and phrases (comprehensive list)
         self.blocked_words = {
@@ -50,6 +76,15 @@ class ContentFilter:
             '.txt', '.csv', '.pdf', '.docx', '.doc', '.md', '.json'
         }
         
+        # Plain-text types whose raw bytes can be scanned for blocked terms
+        self.text_extensions = {'.txt', '.csv', '.md', '.json'}
+        
+        # Sensitive terms that keep a document out of the knowledge base
+        self.business_red_flags = [
+            'confidential', 'secret', 'password', 'api_key', 'private_key',
+            'social_security', 'ssn', 'credit_card', 'bank_account'
+        ]
+        
         # Maximum file size (10MB)
         self.max_file_size = 10 * 1024 * 1024
         
@@ -61,6 +96,15 @@ class ContentFilter:
             r'\b(?:download|stream|watch)\s+(?:porn|adult|xxx)\b',
             r'\b(?:nude|naked)\s+(?:photos|images|pics)\b'
         ]
+        
+        # Verdicts for recently checked text, keyed by (length, digest), so
+        # repeated messages skip the moderation round-trip entirely
+        self.check_cache_size = 4096
+        self._check_cache = OrderedDict()
+        self._check_cache_lock = threading.Lock()
+        
+        # Compiled lazily since subclasses extend blocked_words after __init__
+        self._upload_scanner = None
     
     def check_text_content(self, text: str) -> Tuple[bool, str]:
         """
@@ -70,23 +114,49 @@ class ContentFilter:
         if not text:
             return True, ""
         
+        key = (len(text), hashlib.blake2s(text.encode('utf-8'), digest_size=16).digest())
+        with self._check_cache_lock:
+            cached = self._check_cache.get(key)
+            if cached is not None:
+                self._check_cache.move_to_end(key)
+                return cached
+        
+        result, cacheable = self._check_text_content_uncached(text)
+        if cacheable:
+            with self._check_cache_lock:
+                self._check_cache[key] = result
+                if len(self._check_cache) > self.check_cache_size:
+                    self._check_cache.popitem(last=False)
+        return result
+    
+    def clear_check_cache(self):
+        """Forget cached check_text_content verdicts"""
+        with self._check_cache_lock:
+            self._check_cache.clear()
+    
+    def _check_text_content_uncached(self, text: str) -> Tuple[Tuple[bool, str], bool]:
+        """
+        Run the actual checks
+        Returns: ((is_safe, reason_if_blocked), cacheable)
+        """
         text_lower = text.lower()
         
-        # 1. Check for blocked words
-        for word in self.blocked_words:
-            if word in text_lower:
-                logger.warning(f"Blocked content detected: {word}")
-                return False, f"Content contains inappropriate material: '{word}'"
+        # 1. Check for blocked words (one pass over the text for all words)
+        match = _compile_terms(frozenset(self.blocked_words)).search(text_lower)
+        if match:
+            word = match.group(0)
+            logger.warning("Blocked content detected: %s", word)
+            return (False, f"Content contains inappropriate material: '{word}'"), True
         
         # 2. Check for suspicious patterns
-        for pattern in self.suspicious_patterns:
-            if re.search(pattern, text_lower):
-                logger.warning(f"Suspicious pattern detected: {pattern}")
-                return False, "Content contains potentially harmful requests"
+        match = _compile_patterns(tuple(self.suspicious_patterns)).search(text_lower)
+        if match:
+            logger.warning("Suspicious pattern detected: %s", match.group(0))
+            return (False, "Content contains potentially harmful requests"), True
         
         # 3. Check content length
         if len(text) > 10000:  # 10k character limit
-            return False, "Message too long. Please keep messages under 10,000 characters"
+            return (False, "Message too long. Please keep messages under 10,000 characters"), True
         
         # 4. Use OpenAI Moderation API if available
         if self.openai_client:
@@ -94,19 +164,33 @@ class ContentFilter:
                 moderation = self.openai_client.moderations.create(input=text)
                 if moderation.results[0].flagged:
                     categories = [cat for cat, flagged in moderation.results[0].categories.__dict__.items() if flagged]
-                    return False, f"Content flagged for: {', '.join(categories)}"
+                    return (False, f"Content flagged for: {', '.join(categories)}"), True
             except Exception as e:
                 logger.warning(f"OpenAI moderation check failed: {e}")
+                # Don't remember a pass that the moderation API never confirmed
+                return (True, ""), False
         
-        return True, ""
+        return (True, ""), True
     
     def check_file_upload(self, file_path: str, file_content: bytes) -> Tuple[bool, str]:
         """
         Check if uploaded file is safe and appropriate
         Returns: (is_safe, reason_if_blocked)
         """
+        text_content = None
+        if Path(file_path).suffix.lower() in self.text_extensions:
+            text_content = file_content.decode('utf-8', errors='ignore')
+        return self.check_streamed_upload(file_path, len(file_content), file_content[:16], text_content)
+    
+    def check_streamed_upload(self, file_path: str, file_size: int, head: bytes,
+                              text_content: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        check_file_upload for uploads that were streamed rather than buffered
+        head is the first bytes of the file; text_content the decoded text (text files only)
+        Returns: (is_safe, reason_if_blocked)
+        """
         # 1. Check file size
-        if len(file_content) > self.max_file_size:
+        if file_size > self.max_file_size:
             return False, f"File too large. Maximum size is {self.max_file_size // (1024*1024)}MB"
         
         # 2. Check file extension
@@ -119,17 +203,13 @@ class ContentFilter:
             return False, f"Only these file types are allowed: {', '.join(self.allowed_extensions)}"
         
         # 3. Check file content for text files
-        if file_ext in ['.txt', '.csv', '.md', '.json']:
-            try:
-                text_content = file_content.decode('utf-8', errors='ignore')
-                is_safe, reason = self.check_text_content(text_content)
-                if not is_safe:
-                    return False, f"File contains inappropriate content: {reason}"
-            except Exception as e:
-                logger.warning(f"Could not analyze file content: {e}")
+        if text_content is not None and file_ext in self.text_extensions:
+            is_safe, reason = self.check_text_content(text_content)
+            if not is_safe:
+                return False, f"File contains inappropriate content: {reason}"
         
         # 4. Check for malicious file signatures
-        if self._is_potentially_malicious(file_content):
+        if self._is_potentially_malicious(head):
             return False, "File appears to contain executable or potentially harmful content"
         
         return True, ""
@@ -176,18 +256,38 @@ class ContentFilter:
             return is_safe, reason
         
         # Additional checks for business content
-        business_red_flags = [
-            'confidential', 'secret', 'password', 'api_key', 'private_key',
-            'social_security', 'ssn', 'credit_card', 'bank_account'
-        ]
-        
-        content_lower = content.lower()
-        for flag in business_red_flags:
-            if flag in content_lower:
-                return False, f"Document contains sensitive information: {flag}"
+        match = _compile_terms(frozenset(self.business_red_flags)).search(content.lower())
+        if match:
+            return False, f"Document contains sensitive information: {match.group(0)}"
         
         return True, ""
     
+    def _get_upload_scanner(self):
+        """Compile blocked words and business red flags into one bytes pattern"""
+        words = frozenset(self.blocked_words)
+        if self._upload_scanner is None or self._upload_scanner[0] != words:
+            # Longest terms first so the reported match is the most specific one
+            terms = sorted(words.union(self.business_red_flags), key=len, reverse=True)
+            pattern = re.compile(b'|'.join(re.escape(term.encode('utf-8')) for term in terms), re.IGNORECASE)
+            self._upload_scanner = (words, pattern, max(len(term) for term in terms))
+        return self._upload_scanner[1], self._upload_scanner[2]
+    
+    def scan_upload_chunk(self, chunk: bytes, tail: bytes = b"") -> Tuple[Optional[str], bytes]:
+        """
+        Scan raw upload bytes for blocked terms in a single pass, without decoding
+        Pass the returned tail into the next call so terms split across chunks are found
+        Returns: (reason_if_blocked, tail)
+        """
+        pattern, longest = self._get_upload_scanner()
+        data = tail + chunk
+        match = pattern.search(data)
+        if match:
+            term = match.group(0).decode('utf-8').lower()
+            if term in self.blocked_words:
+                return f"Content contains inappropriate material: '{term}'", b""
+            return f"Document contains sensitive information: {term}", b""
+        return None, data[-(longest - 1):] if longest > 1 else b""
+    
     def generate_content_hash(self, content: str) -> str:
         """Generate hash for content deduplication and tracking"""
         return hashlib.sha256(content.encode()).hexdigest()
@@ -196,39 +296,81 @@ class ContentFilter:
         """Categorize content type for logging and analytics"""
         text_lower = text.lower()
         
-        if any(word in text_lower for word in ['question', 'help', 'how', 'what', 'why']):
-            return 'question'
-        elif any(word in text_lower for word in ['thank', 'thanks', 'good', 'great']):
-            return 'appreciation'
-        elif any(word in text_lower for word in ['problem', 'issue', 'error', 'wrong']):
-            return 'problem_report'
-        else:
-            return 'general'
+        for category, matcher in _CATEGORY_MATCHERS:
+            if matcher.search(text_lower):
+                return category
+        return 'general'
 
 class ContentModerationLogger:
     """Log content moderation events for security monitoring"""
     
-    def __init__(self):
+    def __init__(self, log_file: Optional[str] = None, log_blocked: bool = True, log_uploads: bool = True):
         self.logger = logging.getLogger('content_moderation')
+        self.log_file = log_file
+        # Mirror ContentFilterConfig.LOG_BLOCKED_CONTENT / LOG_FILE_UPLOADS
+        self.log_blocked = log_blocked
+        self.log_uploads = log_uploads
+        self._queue_handler = None
+        self._listener = None
+    
+    def start(self):
+        """
+        Hand log records to a background thread
+        Callers only enqueue; stream/file writes happen on the listener thread
+        """
+        if self._listener:
+            return
+        
+        formatter = logging.Formatter(logging.BASIC_FORMAT)
+        handlers = [logging.StreamHandler()]
+        if self.log_file:
+            handlers.append(logging.FileHandler(self.log_file))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        
+        log_queue = queue.SimpleQueue()
+        self._queue_handler = QueueHandler(log_queue)
+        self.logger.addHandler(self._queue_handler)
+        self.logger.propagate = False
+        
+        self._listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self._listener.start()
+    
+    def stop(self):
+        """Flush queued records and go back to synchronous logging"""
+        if not self._listener:
+            return
+        
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self.logger.removeHandler(self._queue_handler)
+        self.logger.propagate = True
+        self._queue_handler = None
+        self._listener = None
         
     def log_blocked_content(self, content_type: str, reason: str, user_ip: str = None):
         """Log when content is blocked"""
-        self.logger.warning(f"BLOCKED: {content_type} - {reason} - IP: {user_ip}")
+        if not self.log_blocked:
+            return
+        self.logger.warning("BLOCKED: %s - %s - IP: %s", content_type, reason, user_ip)
     
     def log_file_upload(self, filename: str, file_size: int, status: str, user_ip: str = None):
         """Log file upload attempts"""
-        self.logger.info(f"FILE_UPLOAD: {filename} ({file_size} bytes) - {status} - IP: {user_ip}")
+        if not self.log_uploads:
+            return
+        self.logger.info("FILE_UPLOAD: %s (%d bytes) - %s - IP: %s", filename, file_size, status, user_ip)
     
     def log_suspicious_activity(self, activity: str, details: str, user_ip: str = None):
         """Log suspicious user activity"""
-        self.logger.warning(f"SUSPICIOUS: {activity} - {details} - IP: {user_ip}")
+        self.logger.warning("SUSPICIOUS: %s - %s - IP: %s", activity, details, user_ip)
 
 # Pre-configured content filters for different use cases
 class BusinessContentFilter(ContentFilter):
     """Stricter content filter for business environments"""
     
-    def __init__(self, openai_api_key: Optional[str] = None):
-        super().__init__(openai_api_key)
+    def __init__(self, openai_api_key: Optional[str] = None, http_client=None):
+        super().__init__(openai_api_key, http_client)
         
         # Additional business-specific blocked words
         self.blocked_words.update({
@@ -239,8 +381,8 @@ class BusinessContentFilter(ContentFilter):
 class EducationalContentFilter(ContentFilter):
     """Content filter optimized for educational environments"""
     
-    def __init__(self, openai_api_key: Optional[str] = None):
-        super().__init__(openai_api_key)
+    def __init__(self, openai_api_key: Optional[str] = None, http_client=None):
+        super().__init__(openai_api_key, http_client)
         
         # More lenient for educational discussions but still safe
         educational_exceptions = {
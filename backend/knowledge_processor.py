@@ -10,12 +10,14 @@ import chromadb
 
 
 class KnowledgeProcessor:
-    def __init__(self, persist_directory: str = "./chroma_db"):
-        """Initialize the knowledge processor with vector database."""
+    def __init__(self, persist_directory: str = "./chroma_db", embeddings=None):
+        """Initialize the knowledge processor with vector database.
+        
+        embeddings: an already loaded embedding model to reuse; a new one is
+        loaded when omitted.
+        """
         self.persist_directory = persist_directory
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
+        self.embeddings = embeddings or self.load_embeddings()
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
@@ -24,6 +26,13 @@ class KnowledgeProcessor:
         self.vectorstore = None
         self._initialize_vectorstore()
     
+    @staticmethod
+    def load_embeddings() -> HuggingFaceEmbeddings:
+        """Load the local sentence-transformers embedding model."""
+        return HuggingFaceEmbeddings(
+            model_name="sentence-transformers/all-MiniLM-L6-v2"
+        )
+    
     def _initialize_vectorstore(self):
         """Initialize or load existing ChromaDB vectorstore."""
         try:
@@ -5,7 +5,7 @@ Handles chat and document uploads in multiple languages including Hindi, Japanes
 
 import re
 import logging
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, NamedTuple, Tuple, Optional, Any
 from langdetect import detect, detect_langs
 from langdetect.lang_detect_exception import LangDetectException
 import unicodedata
@@ -14,12 +14,27 @@ from openai import OpenAI
 # Setup logging
 logger = logging.getLogger(__name__)
 
+class LangResult(NamedTuple):
+    """Flat view of process_multilingual_chat for the request path"""
+    english: str
+    code: str
+    name: str
+    confidence: float
+    is_safe: bool
+    safety_reason: str
+    auto_translate: bool
+    
+    @property
+    def needs_translation(self) -> bool:
+        """Whether replies should be translated back into the user's language"""
+        return self.code != 'en' and self.auto_translate
+
 class MultiLanguageSupport:
     """Comprehensive multi-language support for the chatbot"""
     
-    def __init__(self, openai_api_key: Optional[str] = None):
+    def __init__(self, openai_api_key: Optional[str] = None, http_client=None):
         """Initialize multi-language support"""
-        self.openai_client = OpenAI(api_key=openai_api_key) if openai_api_key else None
+        self.openai_client = OpenAI(api_key=openai_api_key, http_client=http_client) if openai_api_key else None
         
         # Supported languages configuration
         self.supported_languages = {
@@ -371,6 +386,19 @@ class MultiLanguageSupport:
             'requires_translation': detected_lang != 'en'
         }
     
+    def analyze_for_chat(self, message: str) -> LangResult:
+        """process_multilingual_chat repacked as the LangResult the chat endpoints read"""
+        analysis = self.process_multilingual_chat(message)
+        return LangResult(
+            english=analysis['english_message'],
+            code=analysis['detected_language'],
+            name=analysis['language_info']['name'],
+            confidence=analysis['confidence'],
+            is_safe=analysis['is_safe'],
+            safety_reason=analysis['safety_reason'],
+            auto_translate=analysis['language_info'].get('auto_translate', False)
+        )
+    
     def process_multilingual_response(self, english_response: str, target_lang: str) -> str:
         """
         Process AI response and translate back to user's language if needed
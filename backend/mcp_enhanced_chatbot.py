@@ -6,19 +6,56 @@ Extends the existing chatbot with Model Context Protocol tools
 import os
 import json
 import asyncio
+import logging
+from collections import Counter
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-import requests
-import sqlite3
+import httpx
+import aiofiles
+import aiosqlite
+import numpy as np
 from pathlib import Path
 
 # Import your existing chatbot
 from backend.chatbot import ChatBot
 from config import ChatBotConfig
 
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Characters permitted in calculator expressions; everything else is stripped
+# with a single C-level bytes.translate call instead of a per-char generator
+_MATH_ALLOWED_CHARS = b'0123456789+-*/.() '
+_MATH_DELETE_BYTES = bytes(b for b in range(256) if b not in _MATH_ALLOWED_CHARS)
+
+# Async client for the external tool APIs when the bot isn't given the
+# server's shared one; awaited so tool calls don't block the event loop
+_HTTP = httpx.AsyncClient(
+    timeout=5,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+    transport=httpx.AsyncHTTPTransport(retries=2)
+)
+
+# Cosine similarity above which a tool description is considered relevant;
+# kept high since every extra tool costs a network call
+_TOOL_SIMILARITY_THRESHOLD = 0.55
+
+# Analytics database used by the query_data tool
+_ANALYTICS_DB_PATH = 'data/chatbot_analytics.db'
+_Q_USER_COUNT = "SELECT COUNT(*) FROM users"
+_Q_RECENT_CHATS = "SELECT COUNT(*) FROM conversations WHERE date > datetime('now', '-7 days')"
+
 class MCPEnhancedChatBot(ChatBot):
     """Enhanced ChatBot with MCP tool integration"""
     
+    # Directories the read_file tool may access, resolved once at import
+    # (trailing separator so '/data' does not also match '/data-other')
+    _ALLOWED_DIRS: tuple = tuple(
+        os.path.join(str(Path(d).resolve()), '')
+        for d in ('./uploads', './documents', './data')
+    )
+    
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
@@ -26,8 +63,31 @@ class MCPEnhancedChatBot(ChatBot):
         self.tools = {}
         self._register_tools()
         
+        # The registry is static after registration, so build the listing once
+        self._available_tools_cache = [
+            {
+                'name': name,
+                'description': tool['description'],
+                'parameters': tool['parameters']
+            }
+            for name, tool in self.tools.items()
+        ]
+        
+        # Semantic tool selection: embed tool descriptions once with the
+        # knowledge processor's local model and memoize per-query matches
+        self._tool_names = list(self.tools.keys())
+        self._tool_vecs = self._embed_tool_descriptions()
+        self._match_tools_semantic = lru_cache(maxsize=4096)(self._semantic_tool_match)
+        
         # Tool usage tracking
-        self.tool_usage_stats = {}
+        self.tool_usage_stats = Counter()
+        
+        # Analytics DB connection, opened lazily and kept until close()
+        self._analytics_db = None
+        self._analytics_db_lock = asyncio.Lock()
+        
+        # Tool API calls share the server's pooled client when one was provided
+        self._http = self.http_async_client or _HTTP
         
     def _register_tools(self):
         """Register all available MCP tools"""
@@ -87,8 +147,8 @@ class MCPEnhancedChatBot(ChatBot):
             # Create enhanced context
             enhanced_context = self._create_enhanced_context(message, tool_results)
             
-            # Get AI response with tool context
-            response = await self.chat(enhanced_context, session_id)
+            # Get AI response with tool context (the LLM call blocks, so run it in a thread)
+            response = await asyncio.to_thread(self.chat, enhanced_context)
             
             # Track tool usage
             self._track_tool_usage(tool_analysis['tools'])
@@ -103,7 +163,7 @@ class MCPEnhancedChatBot(ChatBot):
             }
         else:
             # Use normal chat flow
-            response = await self.chat(message, session_id)
+            response = await asyncio.to_thread(self.chat, message)
             return {
                 "response": response["response"],
                 "enhanced": False,
@@ -111,6 +171,31 @@ class MCPEnhancedChatBot(ChatBot):
                 "timestamp": datetime.now().isoformat()
             }
 
+    def _embed_tool_descriptions(self) -> Optional[np.ndarray]:
+        """Embed and L2-normalize every tool description (None if unavailable)"""
+        try:
+            embeddings = self.knowledge_processor.embeddings
+            vecs = np.asarray(
+                embeddings.embed_documents([self.tools[name]['description'] for name in self._tool_names]),
+                dtype=np.float32
+            )
+            return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+        except Exception as e:
+            logger.warning("Semantic tool selection unavailable: %s", e)
+            return None
+
+    def _semantic_tool_match(self, message: str) -> tuple:
+        """Return the tools whose descriptions are semantically close to the message"""
+        if self._tool_vecs is None:
+            return ()
+        try:
+            query = np.asarray(self.knowledge_processor.embeddings.embed_query(message), dtype=np.float32)
+            sims = self._tool_vecs @ (query / np.linalg.norm(query))
+        except Exception as e:
+            logger.warning("Semantic tool matching failed: %s", e)
+            return ()
+        return tuple(name for name, sim in zip(self._tool_names, sims) if sim > _TOOL_SIMILARITY_THRESHOLD)
+
     async def _analyze_tool_requirements(self, message: str) -> Dict[str, Any]:
         """Analyze message to determine which tools are needed"""
         
@@ -141,6 +226,12 @@ class MCPEnhancedChatBot(ChatBot):
         if any(word in message_lower for word in ['data', 'database', 'records', 'analytics']):
             required_tools.append('query_data')
         
+        # Semantic matches catch synonyms the keyword lists miss, so they are
+        # only consulted when no keyword matched (embedding the query is
+        # blocking work, so it runs in a thread)
+        if not required_tools:
+            required_tools.extend(await asyncio.to_thread(self._match_tools_semantic, message))
+        
         return {
             'needs_tools': len(required_tools) > 0,
             'tools': required_tools,
@@ -148,34 +239,35 @@ class MCPEnhancedChatBot(ChatBot):
         }
 
     async def _execute_tools(self, tools: List[str], message: str) -> Dict[str, Any]:
-        """Execute the required tools"""
-        
-        results = {}
-        
-        for tool_name in tools:
-            if tool_name in self.tools:
-                try:
-                    # Extract parameters for the tool
-                    params = self._extract_tool_parameters(tool_name, message)
-                    
-                    # Execute the tool
-                    tool_function = self.tools[tool_name]['function']
-                    result = await tool_function(**params)
-                    
-                    results[tool_name] = {
-                        'success': True,
-                        'data': result,
-                        'parameters': params
-                    }
-                    
-                except Exception as e:
-                    results[tool_name] = {
-                        'success': False,
-                        'error': str(e),
-                        'parameters': params if 'params' in locals() else {}
-                    }
-        
-        return results
+        """Execute the required tools concurrently"""
+        
+        names = [tool_name for tool_name in tools if tool_name in self.tools]
+        outcomes = await asyncio.gather(*(self._execute_tool(name, message) for name in names))
+        return dict(zip(names, outcomes))
+
+    async def _execute_tool(self, tool_name: str, message: str) -> Dict[str, Any]:
+        """Execute one tool, capturing its error instead of raising"""
+        params = {}
+        try:
+            # Extract parameters for the tool
+            params = self._extract_tool_parameters(tool_name, message)
+            
+            # Execute the tool
+            tool_function = self.tools[tool_name]['function']
+            result = await tool_function(**params)
+            
+            return {
+                'success': True,
+                'data': result,
+                'parameters': params
+            }
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'parameters': params
+            }
 
     def _extract_tool_parameters(self, tool_name: str, message: str) -> Dict[str, Any]:
         """Extract parameters for specific tools from the message"""
@@ -228,7 +320,7 @@ class MCPEnhancedChatBot(ChatBot):
                 'units': 'metric'
             }
             
-            response = requests.get(url, params=params, timeout=5)
+            response = await self._http.get(url, params=params, timeout=5)
             data = response.json()
             
             if response.status_code == 200:
@@ -249,8 +341,11 @@ class MCPEnhancedChatBot(ChatBot):
         """Perform mathematical calculations safely"""
         try:
             # Sanitize expression (basic safety)
-            allowed_chars = '0123456789+-*/.() '
-            clean_expr = ''.join(c for c in expression if c in allowed_chars)
+            clean_expr = (
+                expression.encode('ascii', 'ignore')
+                .translate(None, _MATH_DELETE_BYTES)
+                .decode('ascii')
+            )
             
             if not clean_expr:
                 return {"error": "Invalid mathematical expression"}
@@ -271,22 +366,22 @@ class MCPEnhancedChatBot(ChatBot):
         """Read content from a file"""
         try:
             # Security check - only allow certain directories
-            allowed_dirs = ['./uploads', './documents', './data']
+            # (compare resolved paths so '..' segments cannot escape them)
             path_obj = Path(file_path)
             
-            if not any(str(path_obj).startswith(allowed_dir) for allowed_dir in allowed_dirs):
+            if not str(path_obj.resolve()).startswith(self._ALLOWED_DIRS):
                 return {"error": "File access not allowed in this directory"}
             
             if not path_obj.exists():
                 return {"error": f"File not found: {file_path}"}
             
-            # Read file content
-            with open(path_obj, 'r', encoding='utf-8') as f:
-                content = f.read()
+            # Read one character past the 5000-char limit so truncation can be detected
+            async with aiofiles.open(path_obj, 'r', encoding='utf-8', errors='replace') as f:
+                content = await f.read(5001)
             
             return {
                 'file_path': file_path,
-                'size_bytes': len(content),
+                'size_bytes': path_obj.stat().st_size,
                 'content': content[:5000],  # Limit to 5KB for performance
                 'truncated': len(content) > 5000
             }
@@ -306,7 +401,7 @@ class MCPEnhancedChatBot(ChatBot):
                 'skip_disambig': '1'
             }
             
-            response = requests.get(url, params=params, timeout=5)
+            response = await self._http.get(url, params=params, timeout=5)
             data = response.json()
             
             # Extract relevant information
@@ -338,7 +433,7 @@ class MCPEnhancedChatBot(ChatBot):
                 'apikey': api_key
             }
             
-            response = requests.get(url, params=params, timeout=5)
+            response = await self._http.get(url, params=params, timeout=5)
             data = response.json()
             
             if 'Global Quote' in data:
@@ -356,34 +451,44 @@ class MCPEnhancedChatBot(ChatBot):
         except Exception as e:
             return {"error": f"Stock service error: {str(e)}"}
 
+    async def _get_analytics_db(self) -> aiosqlite.Connection:
+        """Get the shared analytics DB connection, opening it on first use"""
+        # Locked so concurrent first calls don't each open (and leak) a connection
+        async with self._analytics_db_lock:
+            if self._analytics_db is None:
+                self._analytics_db = await aiosqlite.connect(_ANALYTICS_DB_PATH)
+            return self._analytics_db
+
+    async def aclose(self):
+        """Close the analytics DB connection if it was opened"""
+        async with self._analytics_db_lock:
+            if self._analytics_db is not None:
+                await self._analytics_db.close()
+                self._analytics_db = None
+
     async def _query_data(self, query: str) -> Dict[str, Any]:
         """Query internal data sources"""
         try:
             # Example: Query a local SQLite database
-            db_path = 'data/chatbot_analytics.db'
-            
-            if not os.path.exists(db_path):
+            if self._analytics_db is None and not os.path.exists(_ANALYTICS_DB_PATH):
                 return {"error": "Analytics database not found"}
             
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
+            db = await self._get_analytics_db()
             
             # Simple analytics queries
             if 'user count' in query.lower():
-                cursor.execute("SELECT COUNT(*) FROM users")
-                count = cursor.fetchone()[0]
+                async with db.execute(_Q_USER_COUNT) as cursor:
+                    (count,) = await cursor.fetchone()
                 result = f"Total users: {count}"
             
             elif 'recent chats' in query.lower():
-                cursor.execute("SELECT COUNT(*) FROM conversations WHERE date > datetime('now', '-7 days')")
-                count = cursor.fetchone()[0]
+                async with db.execute(_Q_RECENT_CHATS) as cursor:
+                    (count,) = await cursor.fetchone()
                 result = f"Chats in last 7 days: {count}"
             
             else:
                 result = "Available queries: user count, recent chats"
             
-            conn.close()
-            
             return {
                 'query': query,
                 'result': result,
@@ -459,26 +564,15 @@ class MCPEnhancedChatBot(ChatBot):
 
     def _track_tool_usage(self, tools: List[str]):
         """Track tool usage for analytics"""
-        for tool in tools:
-            if tool in self.tool_usage_stats:
-                self.tool_usage_stats[tool] += 1
-            else:
-                self.tool_usage_stats[tool] = 1
+        self.tool_usage_stats.update(tools)
 
     def get_tool_usage_stats(self) -> Dict[str, int]:
         """Get tool usage statistics"""
-        return self.tool_usage_stats.copy()
+        return dict(self.tool_usage_stats)
 
     def get_available_tools(self) -> List[Dict[str, Any]]:
-        """Get list of available tools"""
-        return [
-            {
-                'name': name,
-                'description': tool['description'],
-                'parameters': tool['parameters']
-            }
-            for name, tool in self.tools.items()
-        ]
+        """Get list of available tools (cached; treat as read-only)"""
+        return self._available_tools_cache
 
 
 # Example usage
@@ -4,139 +4,218 @@ Security middleware for production deployment
 
 import time
 import logging
-from typing import Callable
-from fastapi import Request, Response, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import redis
+import redis.asyncio
 import os
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Redis connection for rate limiting
+# Redis connections: the sync client is shared with the API caches, the async
+# one lets rate limiting run without blocking the event loop
 redis_client = None
+async_redis_client = None
 if os.getenv("REDIS_URL"):
     try:
         redis_client = redis.from_url(os.getenv("REDIS_URL"))
+        async_redis_client = redis.asyncio.from_url(os.getenv("REDIS_URL"))
     except Exception as e:
         logger.warning(f"Could not connect to Redis: {e}")
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+# Atomic per-window counter: INCR, and set the expiry on the first hit
+_RATE_LIMIT_LUA = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
+
+# The middlewares below are plain ASGI callables rather than
+# BaseHTTPMiddleware subclasses: they never build Request/Response objects or
+# spawn a task per hop, and only wrap `send` where headers must be changed.
+
+def _client_ip(scope: Scope) -> str:
+    """Client IP, preferring the first X-Forwarded-For hop"""
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+class SecurityHeadersMiddleware:
     """Add security headers to all responses"""
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        response = await call_next(request)
-        
-        # Security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        response.headers["Content-Security-Policy"] = "default-src 'self'"
-        
-        return response
+    # Security headers
+    HEADERS = [
+        (b"x-content-type-options", b"nosniff"),
+        (b"x-frame-options", b"DENY"),
+        (b"x-xss-protection", b"1; mode=block"),
+        (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+        (b"referrer-policy", b"strict-origin-when-cross-origin"),
+        (b"content-security-policy", b"default-src 'self'"),
+    ]
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + self.HEADERS
+            await send(message)
+        
+        await self.app(scope, receive, send_with_headers)
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Rate limiting middleware"""
+class RateLimitMiddleware:
+    """Rate limiting middleware shared across workers through Redis"""
     
-    def __init__(self, app, calls_per_minute: int = 60):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, calls_per_minute: int = 60):
+        self.app = app
         self.calls_per_minute = calls_per_minute
+        self._script = async_redis_client.register_script(_RATE_LIMIT_LUA) if async_redis_client else None
+        
+        # L1: clients Redis already reported over the limit, per window, so
+        # a flooding client is rejected without another Redis round-trip
+        self._blocked = {}
+        self._blocked_window = None
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        if not redis_client:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        if not self._script:
             # If Redis is not available, skip rate limiting
-            return await call_next(request)
-        
-        # Get client IP
-        client_ip = request.client.host
-        if request.headers.get("X-Forwarded-For"):
-            client_ip = request.headers.get("X-Forwarded-For").split(",")[0].strip()
-        
-        # Rate limiting key
-        key = f"rate_limit:{client_ip}"
-        
-        try:
-            # Get current count
-            current = redis_client.get(key)
-            
-            if current is None:
-                # First request
-                redis_client.setex(key, 60, 1)
-            else:
-                count = int(current)
-                if count >= self.calls_per_minute:
-                    return JSONResponse(
-                        status_code=429,
-                        content={"error": "Rate limit exceeded. Please try again later."}
-                    )
-                # Increment counter
-                redis_client.incr(key)
-            
-        except Exception as e:
-            logger.error(f"Rate limiting error: {e}")
-            # If Redis fails, allow the request
-            pass
-        
-        return await call_next(request)
+            await self.app(scope, receive, send)
+            return
+        
+        client_ip = _client_ip(scope)
+        now = time.time()
+        window = int(now // 60)
+        
+        if window != self._blocked_window:
+            self._blocked.clear()
+            self._blocked_window = window
+        
+        if client_ip not in self._blocked:
+            try:
+                # Rate limiting key for this client and minute
+                count = await self._script(keys=[f"rl:{client_ip}:{window}"], args=[60])
+                if count > self.calls_per_minute:
+                    self._blocked[client_ip] = True
+            except Exception as e:
+                logger.error(f"Rate limiting error: {e}")
+                # If Redis fails, allow the request
+        
+        if client_ip in self._blocked:
+            response = JSONResponse(
+                status_code=429,
+                content={"error": "Rate limit exceeded. Please try again later."},
+                headers={"Retry-After": str(60 - int(now) % 60)}
+            )
+            await response(scope, receive, send)
+            return
+        
+        await self.app(scope, receive, send)
 
-class LoggingMiddleware(BaseHTTPMiddleware):
+class LoggingMiddleware:
     """Request/Response logging middleware"""
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        start_time = time.time()
-        
-        # Log request
-        logger.info(f"Request: {request.method} {request.url} - {request.client.host}")
-        
-        # Process request
-        response = await call_next(request)
-        
-        # Calculate response time
-        process_time = time.time() - start_time
-        
-        # Log response
-        logger.info(
-            f"Response: {response.status_code} - "
-            f"Time: {process_time:.3f}s - "
-            f"Size: {response.headers.get('content-length', 'unknown')}"
-        )
-        
-        # Add response time header
-        response.headers["X-Process-Time"] = str(process_time)
-        
-        return response
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start_time = time.perf_counter()
+        
+        # Log request (the target is only assembled when INFO is enabled)
+        if logger.isEnabledFor(logging.INFO):
+            query = scope.get("query_string", b"")
+            target = scope["path"] + ("?" + query.decode("latin-1") if query else "")
+            client = scope.get("client")
+            logger.info("Request: %s %s - %s", scope["method"], target, client[0] if client else "unknown")
+        
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                # Calculate response time
+                process_time = time.perf_counter() - start_time
+                headers = list(message.get("headers", []))
+                size = next((value.decode("latin-1") for name, value in headers if name == b"content-length"), "unknown")
+                
+                # Log response
+                logger.info("Response: %s - Time: %.3fs - Size: %s", message["status"], process_time, size)
+                
+                # Add response time header
+                headers.append((b"x-process-time", str(process_time).encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+        
+        await self.app(scope, receive, send_with_timing)
 
-class APIKeyValidationMiddleware(BaseHTTPMiddleware):
+class APIKeyValidationMiddleware:
     """Validate API keys for sensitive endpoints"""
     
-    def __init__(self, app, protected_paths: list = None):
-        super().__init__(app)
-        self.protected_paths = protected_paths or ["/initialize", "/chat", "/load-knowledge"]
+    def __init__(self, app: ASGIApp, protected_paths: list = None):
+        self.app = app
+        self.protected_paths = tuple(protected_paths or ["/initialize", "/chat", "/load-knowledge"])
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        # Skip validation for non-protected paths
-        if not any(request.url.path.startswith(path) for path in self.protected_paths):
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # Skip validation for non-HTTP scopes and non-protected paths
+        if scope["type"] != "http" or not scope["path"].startswith(self.protected_paths):
+            await self.app(scope, receive, send)
+            return
         
         # Check if this is an OPTIONS request (CORS preflight)
-        if request.method == "OPTIONS":
-            return await call_next(request)
+        if scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
         
         # For now, we'll rely on the application-level API key validation
         # This middleware can be extended for additional API key checks
         
-        return await call_next(request)
+        await self.app(scope, receive, send)
 
-class HealthCheckMiddleware(BaseHTTPMiddleware):
+class UploadSizeLimitMiddleware:
+    """Reject oversized uploads from their Content-Length before the body is read"""
+    
+    def __init__(self, app: ASGIApp, max_bytes: int, paths: list = None, detail: str = "Request body too large"):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = tuple(paths or ["/load-knowledge"])
+        self.detail = detail
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and scope["path"].startswith(self.paths):
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > self.max_bytes:
+                        response = JSONResponse(status_code=413, content={"detail": self.detail})
+                        await response(scope, receive, send)
+                        return
+                    break
+        
+        await self.app(scope, receive, send)
+
+class HealthCheckMiddleware:
     """Health check endpoint that bypasses other middleware"""
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        if request.url.path == "/health":
-            return JSONResponse(
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and scope["path"] == "/health":
+            response = JSONResponse(
                 status_code=200,
                 content={
                     "status": "healthy",
@@ -144,5 +223,7 @@ class HealthCheckMiddleware(BaseHTTPMiddleware):
                     "version": "1.0.0"
                 }
             )
+            await response(scope, receive, send)
+            return
         
-        return await call_next(request) 
\ No newline at end of file
+        await self.app(scope, receive, send)
@@ -0,0 +1,90 @@
+"""
+OpenAI Rate Limiter for AI ChatBot
+Paces outgoing OpenAI requests to the account's limits instead of retrying after 429s
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import FrozenSet
+
+import httpx
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+OPENAI_HOSTS = frozenset({"api.openai.com"})
+
+class OpenAIRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets shared by every OpenAI call
+
+    Installed as httpx request hooks on the shared clients, so chat,
+    moderation and translation calls are all paced, whether they run on the
+    event loop or in worker threads. Callers reserve capacity up front and
+    sleep until the buckets have refilled enough to cover them.
+    """
+
+    def __init__(self,
+                 requests_per_minute: int = 3500,
+                 tokens_per_minute: int = 90_000,
+                 hosts: FrozenSet[str] = OPENAI_HOSTS):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.hosts = hosts
+
+        # Current bucket levels; they go negative while callers wait on a reservation
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def estimate_tokens(request: httpx.Request) -> int:
+        """Rough prompt size (~4 bytes per token) without tokenizing the body"""
+        try:
+            return max(1, len(request.content) // 4)
+        except httpx.RequestNotRead:
+            return 1
+
+    def reserve(self, tokens: int) -> float:
+        """Take capacity for one request; returns how long to wait before sending it"""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+            # A single request larger than the whole bucket would wait forever
+            self._requests -= 1
+            self._tokens -= min(tokens, self.tokens_per_minute)
+
+            return max(
+                0.0,
+                -self._requests * 60 / self.requests_per_minute,
+                -self._tokens * 60 / self.tokens_per_minute
+            )
+
+    def _applies_to(self, request: httpx.Request) -> bool:
+        return request.url.host in self.hosts
+
+    def request_hook(self, request: httpx.Request):
+        """httpx.Client request hook"""
+        if not self._applies_to(request):
+            return
+        wait = self.reserve(self.estimate_tokens(request))
+        if wait > 0:
+            logger.debug("Pacing OpenAI request for %.2fs", wait)
+            time.sleep(wait)
+
+    async def async_request_hook(self, request: httpx.Request):
+        """httpx.AsyncClient request hook"""
+        if not self._applies_to(request):
+            return
+        wait = self.reserve(self.estimate_tokens(request))
+        if wait > 0:
+            logger.debug("Pacing OpenAI request for %.2fs", wait)
+            await asyncio.sleep(wait)
@@ -0,0 +1,180 @@
+"""
+Response Cache for AI ChatBot
+Skips repeated LLM round-trips for identical or near-identical questions
+"""
+
+import time
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Two-tier chat response cache: exact message hash plus embedding similarity"""
+
+    def __init__(self,
+                 embeddings=None,
+                 redis_client=None,
+                 ttl_seconds: int = 300,
+                 max_entries: int = 4096,
+                 similarity_threshold: float = 0.90,
+                 max_semantic_entries: int = 256):
+        """
+        embeddings: LangChain embeddings object used for the semantic tier
+                    (disabled when None)
+        redis_client: optional Redis client that backs the exact tier so hits
+                      survive restarts and are shared across workers
+        """
+        self.embeddings = embeddings
+        self.redis_client = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.max_semantic_entries = max_semantic_entries
+
+        # Tier 1: exact key -> (expires_at, response), kept in LRU order
+        self._exact = OrderedDict()
+
+        # Tier 2: (scope, mode) -> list of (expires_at, unit_vector, response)
+        self._semantic = {}
+
+        # Handlers call the cache from worker threads
+        self._lock = threading.Lock()
+        
+        # Lookup outcomes for stats(): hits per tier, plus misses
+        self._hits = {"exact": 0, "redis": 0, "semantic": 0}
+        self._misses = 0
+
+        # Embedding the same message on lookup and on store only costs once
+        self._embed = lru_cache(maxsize=1024)(self._embed_uncached)
+
+    @staticmethod
+    def make_key(scope: str, mode: str, message: str) -> str:
+        """Build the exact-match cache key for a message"""
+        digest = hashlib.md5(message.encode('utf-8')).hexdigest()
+        return f"resp:v1:{mode}:{scope}:{digest}"
+
+    def _embed_uncached(self, message: str) -> Optional[np.ndarray]:
+        """Embed a message and L2-normalize it (None if unavailable)"""
+        if self.embeddings is None:
+            return None
+        try:
+            vec = np.asarray(self.embeddings.embed_query(message), dtype=np.float32)
+            return vec / np.linalg.norm(vec)
+        except Exception as e:
+            logger.warning(f"Response cache embedding failed: {e}")
+            return None
+
+    def get(self, scope: str, mode: str, message: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached response
+        scope should identify everything besides mode and message that the
+        answer depends on (e.g. the knowledge base fingerprint)
+        """
+        key = self.make_key(scope, mode, message)
+        now = time.monotonic()
+
+        # Exact tier (in-process)
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._exact.move_to_end(key)
+                    self._hits["exact"] += 1
+                    return dict(entry[1])
+                del self._exact[key]
+
+        # Exact tier (Redis)
+        if self.redis_client:
+            try:
+                stored = self.redis_client.get(key)
+                if stored:
+                    response = json.loads(stored)
+                    self._store_exact(key, response, now)
+                    self._record("redis")
+                    return dict(response)
+            except Exception as e:
+                logger.warning(f"Response cache Redis lookup failed: {e}")
+
+        # Semantic tier
+        vec = self._embed(message)
+        if vec is None:
+            self._record(None)
+            return None
+
+        with self._lock:
+            entries = [e for e in self._semantic.get((scope, mode), []) if e[0] > now]
+            self._semantic[(scope, mode)] = entries
+            if entries:
+                sims = np.stack([e[1] for e in entries]) @ vec
+                best = int(np.argmax(sims))
+                if sims[best] >= self.similarity_threshold:
+                    self._hits["semantic"] += 1
+                    return dict(entries[best][2])
+            self._misses += 1
+
+        return None
+
+    def _record(self, tier: Optional[str]):
+        """Count a hit in tier (a miss when None)"""
+        with self._lock:
+            if tier is None:
+                self._misses += 1
+            else:
+                self._hits[tier] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Lookup counts and hit rate since startup"""
+        with self._lock:
+            hits = dict(self._hits)
+            misses = self._misses
+        lookups = sum(hits.values()) + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(sum(hits.values()) / lookups, 4) if lookups else 0.0,
+            "entries": len(self._exact)
+        }
+
+    def put(self, scope: str, mode: str, message: str, response: Dict[str, Any]):
+        """Store a response for later lookups"""
+        key = self.make_key(scope, mode, message)
+        now = time.monotonic()
+
+        self._store_exact(key, response, now)
+
+        if self.redis_client:
+            try:
+                self.redis_client.setex(key, self.ttl_seconds, json.dumps(response))
+            except Exception as e:
+                logger.warning(f"Response cache Redis store failed: {e}")
+
+        vec = self._embed(message)
+        if vec is not None:
+            with self._lock:
+                entries = self._semantic.setdefault((scope, mode), [])
+                entries.append((now + self.ttl_seconds, vec, response))
+                if len(entries) > self.max_semantic_entries:
+                    del entries[:len(entries) - self.max_semantic_entries]
+
+    def _store_exact(self, key: str, response: Dict[str, Any], now: float):
+        """Insert into the in-process exact tier, evicting the oldest entry when full"""
+        with self._lock:
+            self._exact[key] = (now + self.ttl_seconds, response)
+            self._exact.move_to_end(key)
+            while len(self._exact) > self.max_entries:
+                self._exact.popitem(last=False)
+
+    def clear(self):
+        """Drop all in-process cache entries"""
+        with self._lock:
+            self._exact.clear()
+            self._semantic.clear()
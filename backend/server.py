@@ -1,29 +1,86 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+from typing import List, Optional, Tuple
+import asyncio
+import codecs
+import functools
+import hashlib
+import json
 import os
+import re
+import threading
+import time
+import orjson
+import httpx
+import aiofiles
+import shutil
 import tempfile
-from backend.chatbot import ChatBot
+from concurrent.futures import ThreadPoolExecutor
+from backend.chatbot import ChatBot, ChatbotContext
+from backend.knowledge_processor import KnowledgeProcessor
 from backend.mcp_enhanced_chatbot import MCPEnhancedChatBot
 from backend.ai_agent_chatbot import AIAgentChatBot
 from backend.content_filter import ContentFilter, ContentModerationLogger, BusinessContentFilter
-from backend.language_support import MultiLanguageSupport, MultilingualContentFilter
+from backend.language_support import MultiLanguageSupport, MultilingualContentFilter, LangResult
+from backend.response_cache import ResponseCache
+from backend.openai_limiter import OpenAIRateLimiter
+from backend import translation_cache
 from backend.middleware import (
     SecurityHeadersMiddleware,
     RateLimitMiddleware,
     LoggingMiddleware,
-    HealthCheckMiddleware
+    HealthCheckMiddleware,
+    UploadSizeLimitMiddleware,
+    redis_client
 )
 
-app = FastAPI(title="ChatBot API", version="1.0.0")
+app = FastAPI(title="ChatBot API", version="1.0.0", default_response_class=ORJSONResponse)
 
-# Initialize content filtering and language support systems
-content_filter = None
-language_support = None
-multilingual_filter = None
-moderation_logger = ContentModerationLogger()
+# Blocking chatbot, translation and moderation calls (OpenAI round-trips,
+# vector store access) are dispatched with asyncio.to_thread so a single
+# slow LLM call does not stall the event loop for every other request.
+# Those threads mostly sit waiting on the network, so the pool is sized
+# above asyncio's default of min(32, cpu_count + 4).
+BLOCKING_THREADS = int(os.getenv("BLOCKING_THREADS", "32"))
+
+# Per-worker chatbots, filters and language support live on app.state. They
+# are replaced as a set by /initialize, and handlers receive them through the
+# get_* dependencies below instead of reading mutable module globals.
+for _name in ("chatbot", "enhanced_chatbot", "agent_chatbot", "content_filter",
+              "language_support", "multilingual_filter", "response_cache", "chatbot_settings",
+              "lang_info", "available_tools", "apology_translations", "embeddings"):
+    setattr(app.state, _name, None)
+app.state.init_lock = asyncio.Lock()
+
+moderation_logger = ContentModerationLogger(
+    log_file=os.getenv("MODERATION_LOG_FILE"),
+    log_blocked=os.getenv("LOG_BLOCKED_CONTENT", "true").lower() == "true",
+    log_uploads=os.getenv("LOG_FILE_UPLOADS", "true").lower() == "true"
+)
+
+# One pooled HTTP/2 client per worker for every OpenAI call (chat, moderation,
+# translation), so requests share TLS connections instead of each SDK client
+# opening its own. Sized for ~3 parallel OpenAI calls per /chat request.
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+_HTTP_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+# OpenAI calls on both clients are paced to the account's rate limits
+# (set either limit to 0 to disable pacing)
+openai_limiter = OpenAIRateLimiter(
+    requests_per_minute=int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "3500")),
+    tokens_per_minute=int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "90000"))
+)
+_PACE_OPENAI = openai_limiter.requests_per_minute > 0 and openai_limiter.tokens_per_minute > 0
+app.state.http = httpx.Client(
+    http2=True, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT,
+    event_hooks={"request": [openai_limiter.request_hook] if _PACE_OPENAI else []}
+)
+app.state.http_async = httpx.AsyncClient(
+    http2=True, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT,
+    event_hooks={"request": [openai_limiter.async_request_hook] if _PACE_OPENAI else []}
+)
 
 # Security and monitoring middleware (order matters!)
 app.add_middleware(HealthCheckMiddleware)
@@ -31,8 +88,37 @@ app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(LoggingMiddleware)
 app.add_middleware(RateLimitMiddleware, calls_per_minute=60)
 
+# Compress larger JSON bodies (chat answers, history, search results)
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
+
+# Upload limits for /load-knowledge, hoisted out of the request path
+UPLOAD_CHUNK_SIZE = 1 << 20  # Read uploads 1MB at a time
+MAX_TOTAL_UPLOAD_BYTES = 50 * 1024 * 1024  # 50MB total limit
+MAX_UPLOAD_FILES = 10
+TOO_MANY_FILES_DETAIL = f"Maximum {MAX_UPLOAD_FILES} files allowed per upload"
+UPLOAD_TOO_LARGE_DETAIL = f"Total file size exceeds {MAX_TOTAL_UPLOAD_BYTES // (1024 * 1024)}MB limit"
+UPLOAD_HEAD_BYTES = 16  # Enough for the executable signature check
+UPLOAD_CONCURRENCY = 4  # Files validated/translated at once per request
+
+# Refuse obviously oversized uploads from Content-Length before the multipart
+# body is spooled; the 1MB allowance covers multipart framing. Registered
+# before CORS so it sits inside it and its 413s carry the CORS headers.
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=MAX_TOTAL_UPLOAD_BYTES + (1 << 20),
+    paths=["/load-knowledge"],
+    detail=UPLOAD_TOO_LARGE_DETAIL
+)
+
 # CORS middleware for React frontend
-cors_origins = os.getenv("CORS_ALLOWED_ORIGINS", "http://localhost:3000").split(",")
+# Parsed once at import into a frozenset, so the per-request origin check is a
+# hash lookup. Added after the middleware above, CORS sits outside them and
+# answers preflight OPTIONS requests before rate limiting or logging run.
+cors_origins = frozenset(
+    origin.strip()
+    for origin in os.getenv("CORS_ALLOWED_ORIGINS", "http://localhost:3000").split(",")
+    if origin.strip()
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=cors_origins,
@@ -41,78 +127,310 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global chatbot instances
-chatbot_instance = None
-enhanced_chatbot_instance = None
-agent_chatbot_instance = None
+# Agents offered by AIAgentChatBot; static, so built once rather than per request
+AVAILABLE_AGENTS_RESPONSE = [
+    {
+        "name": "customer_support",
+        "description": "Handles customer service issues and complaints",
+        "capabilities": ["issue analysis", "resolution planning", "follow-up creation"]
+    },
+    {
+        "name": "data_analyst", 
+        "description": "Analyzes data and provides business insights",
+        "capabilities": ["data analysis", "trend identification", "recommendations"]
+    },
+    {
+        "name": "research_agent",
+        "description": "Conducts comprehensive research and information gathering",
+        "capabilities": ["web research", "competitive analysis", "report generation"]
+    },
+    {
+        "name": "project_manager",
+        "description": "Creates and manages project plans and timelines",
+        "capabilities": ["project planning", "timeline creation", "resource allocation"]
+    },
+    {
+        "name": "task_planner",
+        "description": "Plans and executes general multi-step tasks",
+        "capabilities": ["task breakdown", "execution planning", "workflow automation"]
+    }
+]
+AVAILABLE_AGENT_NAMES = [agent["name"] for agent in AVAILABLE_AGENTS_RESPONSE]
+
+# Settings from the last /initialize call. They are shared through Redis when
+# available so every worker can build its own instances on startup instead of
+# only the worker that happened to serve /initialize. The API key is never
+# shared: other workers take it from OPENAI_API_KEY.
+CHATBOT_SETTINGS_KEY = "chatbot:settings"
+
+# Polled GET payloads are cached as serialized bytes for a short TTL. Anything
+# that changes chatbot state bumps _state_version, which invalidates them all.
+_state_version = 0
+
+def _bump_state_version():
+    """Invalidate cached GET payloads after a state change."""
+    global _state_version
+    _state_version += 1
+
+def _cached_body(ttl: float = 1.0):
+    """Cache an async payload builder's orjson bytes for ttl seconds."""
+    def decorator(func):
+        entry = None  # (expires_at, state_version, body)
+        
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs) -> bytes:
+            nonlocal entry
+            now = time.monotonic()
+            if entry is not None and entry[0] > now and entry[1] == _state_version:
+                return entry[2]
+            version = _state_version
+            body = orjson.dumps(await func(*args, **kwargs))
+            entry = (now + ttl, version, body)
+            return body
+        return wrapper
+    return decorator
 
 # Pydantic models
+# Request bodies are strict and immutable; unknown fields are rejected up front
+# and no type coercion is attempted (JSON numbers/strings/bools must match)
+_REQUEST_MODEL_CONFIG = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True, strict=True)
+_RESPONSE_MODEL_CONFIG = ConfigDict(frozen=True)
+
 class InitializeRequest(BaseModel):
+    model_config = _REQUEST_MODEL_CONFIG
+
     api_key: str
     memory_window: int = 20  # Optional parameter with default
     temperature: float = 0.7  # Optional temperature setting
+    memory_token_budget: int = 2048  # Tokens of history kept before older turns are summarized
 
 class ChatRequest(BaseModel):
+    model_config = _REQUEST_MODEL_CONFIG
+
     message: str
     mode: str = "general"
     session_id: Optional[str] = "default"
+    use_cache: bool = True
 
 class EnhancedChatRequest(BaseModel):
+    model_config = _REQUEST_MODEL_CONFIG
+
     message: str
     session_id: Optional[str] = "default"
     use_tools: bool = True
 
 class AgentChatRequest(BaseModel):
+    model_config = _REQUEST_MODEL_CONFIG
+
     message: str
     session_id: Optional[str] = "default"
     use_agent: bool = True
     preferred_agent: Optional[str] = None  # customer_support, data_analyst, research_agent, project_manager
 
 class ChatResponse(BaseModel):
+    model_config = _RESPONSE_MODEL_CONFIG
+
     response: str
     mode: str
     sources: List[dict] = []
     timestamp: str
     success: bool
 
+# Serializes /chat responses straight through pydantic-core
+_chat_response_adapter = TypeAdapter(ChatResponse)
+
+def _build_instances(settings: dict) -> dict:
+    """Create language support, content filters and chatbots for this worker."""
+    api_key = settings["api_key"]
+    
+    # One API key, connection pool pair and embedding model for all three
+    # bots; the model is also kept across re-initializations
+    context = ChatbotContext(
+        openai_api_key=api_key,
+        http_client=app.state.http,
+        http_async_client=app.state.http_async,
+        embeddings=app.state.embeddings or KnowledgeProcessor.load_embeddings()
+    )
+    
+    # Initialize multi-language support
+    language_support = MultiLanguageSupport(openai_api_key=api_key, http_client=app.state.http)
+    
+    # Initialize content filter with language support
+    content_filter = BusinessContentFilter(openai_api_key=api_key, http_client=app.state.http)
+    multilingual_filter = MultilingualContentFilter(language_support)
+    
+    # Initialize standard, enhanced and agent chatbots
+    chatbot_instance = ChatBot(
+        memory_window=settings["memory_window"],
+        temperature=settings["temperature"],
+        memory_token_budget=settings.get("memory_token_budget", 2048),
+        context=context
+    )
+    
+    enhanced_chatbot_instance = MCPEnhancedChatBot(
+        memory_window=settings["memory_window"],
+        temperature=settings["temperature"],
+        memory_token_budget=settings.get("memory_token_budget", 2048),
+        context=context
+    )
+    
+    agent_chatbot_instance = AIAgentChatBot(
+        memory_window=settings["memory_window"],
+        temperature=settings["temperature"],
+        memory_token_budget=settings.get("memory_token_budget", 2048),
+        context=context
+    )
+    
+    # Reuse the knowledge processor's local embedding model for semantic hits
+    response_cache = ResponseCache(
+        embeddings=chatbot_instance.knowledge_processor.embeddings,
+        redis_client=redis_client
+    )
+    
+    return {
+        "chatbot": chatbot_instance,
+        "enhanced_chatbot": enhanced_chatbot_instance,
+        "agent_chatbot": agent_chatbot_instance,
+        "content_filter": content_filter,
+        "language_support": language_support,
+        "multilingual_filter": multilingual_filter,
+        "response_cache": response_cache,
+        "chatbot_settings": settings,
+        "embeddings": context.embeddings,
+        # Per-language apology for blocked responses, filled on first use
+        "apology_translations": {},
+        # Static per instance set, so computed here instead of per request
+        "lang_info": language_support.get_supported_languages_info(),
+        "available_tools": enhanced_chatbot_instance.get_available_tools()
+    }
+
+async def _initialize_state(settings: dict):
+    """Build a fresh set of instances and publish them on app.state together."""
+    async with app.state.init_lock:
+        instances = await asyncio.to_thread(_build_instances, settings)
+        previous = (app.state.enhanced_chatbot, app.state.agent_chatbot)
+        # No await between these assignments, so no handler sees a mix of
+        # old and new instances
+        for name, value in instances.items():
+            setattr(app.state, name, value)
+        _bump_state_version()
+        await _close_tool_bots(*previous)
+
+async def _close_tool_bots(*bots):
+    """Release the analytics DB connections held by MCP/agent bots."""
+    for bot in bots:
+        if bot:
+            await bot.aclose()
+
+async def get_bot(request: Request) -> ChatBot:
+    """Dependency: the standard chatbot, or 400 if not initialized."""
+    bot = request.app.state.chatbot
+    if not bot:
+        raise HTTPException(status_code=400, detail="Chatbot not initialized")
+    return bot
+
+async def get_enhanced_bot(request: Request) -> MCPEnhancedChatBot:
+    """Dependency: the MCP-enhanced chatbot, or 400 if not initialized."""
+    bot = request.app.state.enhanced_chatbot
+    if not bot:
+        raise HTTPException(status_code=400, detail="Enhanced chatbot not initialized")
+    return bot
+
+async def get_agent_bot(request: Request) -> AIAgentChatBot:
+    """Dependency: the AI Agent chatbot, or 400 if not initialized."""
+    bot = request.app.state.agent_chatbot
+    if not bot:
+        raise HTTPException(status_code=400, detail="AI Agent chatbot not initialized")
+    return bot
+
+async def get_content_filter(request: Request) -> ContentFilter:
+    """Dependency: the content filter, or 400 if not initialized."""
+    content_filter = request.app.state.content_filter
+    if not content_filter or not request.app.state.language_support:
+        raise HTTPException(status_code=400, detail="Content filter or language support not initialized")
+    return content_filter
+
+async def get_language_support(request: Request) -> MultiLanguageSupport:
+    """Dependency: multi-language support, or 400 if not initialized."""
+    language_support = request.app.state.language_support
+    if not language_support or not request.app.state.content_filter:
+        raise HTTPException(status_code=400, detail="Content filter or language support not initialized")
+    return language_support
+
+@app.on_event("startup")
+async def configure_thread_pool():
+    """Size the executor behind asyncio.to_thread for this worker."""
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=BLOCKING_THREADS, thread_name_prefix="blocking")
+    )
+
+@app.on_event("startup")
+async def start_moderation_logging():
+    """Move moderation log I/O off the request path."""
+    moderation_logger.start()
+
+@app.on_event("shutdown")
+async def stop_moderation_logging():
+    """Flush queued moderation log records."""
+    moderation_logger.stop()
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    """Close the shared OpenAI HTTP connection pools."""
+    await app.state.http_async.aclose()
+    await asyncio.to_thread(app.state.http.close)
+
+@app.on_event("shutdown")
+async def close_tool_bots():
+    """Close the MCP/agent bots' analytics DB connections."""
+    await _close_tool_bots(app.state.enhanced_chatbot, app.state.agent_chatbot)
+
+@app.on_event("startup")
+async def load_shared_settings():
+    """Build this worker's chatbots from settings stored by another worker."""
+    if not redis_client:
+        return
+    
+    try:
+        stored = await asyncio.to_thread(redis_client.get, CHATBOT_SETTINGS_KEY)
+        if not stored:
+            return
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            moderation_logger.logger.warning("Shared chatbot settings found but OPENAI_API_KEY is not set; waiting for /initialize")
+            return
+        await _initialize_state({**json.loads(stored), "api_key": api_key})
+        moderation_logger.logger.info("Chatbot initialized from shared settings")
+    except Exception as e:
+        moderation_logger.logger.warning(f"Could not initialize chatbot from shared settings: {e}")
+
 @app.post("/initialize")
 async def initialize_chatbot(request: InitializeRequest, http_request: Request):
     """Initialize the chatbot with OpenAI API key and multi-language support."""
-    global chatbot_instance, enhanced_chatbot_instance, content_filter, language_support, multilingual_filter
+    settings = {
+        "api_key": request.api_key,
+        "memory_window": request.memory_window,
+        "temperature": request.temperature,
+        "memory_token_budget": request.memory_token_budget
+    }
     
     try:
-        # Initialize multi-language support
-        language_support = MultiLanguageSupport(openai_api_key=request.api_key)
-        
-        # Initialize content filter with language support
-        content_filter = BusinessContentFilter(openai_api_key=request.api_key)
-        multilingual_filter = MultilingualContentFilter(language_support)
+        # Serialize initialization so concurrent calls cannot interleave
+        await _initialize_state(settings)
         
-        # Initialize both standard and enhanced chatbots
-        chatbot_instance = ChatBot(
-            openai_api_key=request.api_key,
-            memory_window=request.memory_window,
-            temperature=request.temperature
-        )
-        
-        enhanced_chatbot_instance = MCPEnhancedChatBot(
-            openai_api_key=request.api_key,
-            memory_window=request.memory_window,
-            temperature=request.temperature
-        )
-        
-        agent_chatbot_instance = AIAgentChatBot(
-            openai_api_key=request.api_key,
-            memory_window=request.memory_window,
-            temperature=request.temperature
-        )
+        # Share settings so other workers can initialize themselves
+        if redis_client:
+            try:
+                shared = {key: value for key, value in settings.items() if key != "api_key"}
+                await asyncio.to_thread(redis_client.set, CHATBOT_SETTINGS_KEY, json.dumps(shared))
+            except Exception as e:
+                moderation_logger.logger.warning(f"Could not share chatbot settings: {e}")
         
         # Log successful initialization
         client_ip = http_request.client.host
-        moderation_logger.logger.info(f"Chatbot initialized with multi-language support and MCP tools - IP: {client_ip}")
+        moderation_logger.logger.info("Chatbot initialized with multi-language support and MCP tools - IP: %s", client_ip)
         
-        # Get supported languages info
-        lang_info = language_support.get_supported_languages_info()
+        lang_info = app.state.lang_info
         
         return {
             "success": True, 
@@ -122,138 +440,322 @@ async def initialize_chatbot(request: InitializeRequest, http_request: Request):
             "rtl_support": len(lang_info['rtl_languages']) > 0,
             "mcp_tools_enabled": True,
             "ai_agents_enabled": True,
-            "available_tools": enhanced_chatbot_instance.get_available_tools() if enhanced_chatbot_instance else [],
-            "available_agents": ["customer_support", "data_analyst", "research_agent", "project_manager", "task_planner"]
+            "available_tools": app.state.available_tools,
+            "available_agents": AVAILABLE_AGENT_NAMES
         }
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to initialize chatbot: {str(e)}")
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_with_bot(request: ChatRequest, http_request: Request):
-    """Send a message to the chatbot with multi-language support and content filtering."""
-    global chatbot_instance, content_filter, language_support, multilingual_filter
+async def _analyze_message(message: str, language_support: MultiLanguageSupport) -> LangResult:
+    """analyze_for_chat through the translation cache"""
+    cached = await translation_cache.get_cached_analysis(message)
+    if cached is not None:
+        # Only detection and translation are cached; safety is checked fresh
+        is_safe, safety_reason = await asyncio.to_thread(
+            language_support.check_multilingual_content, message, cached["code"]
+        )
+        return LangResult(is_safe=is_safe, safety_reason=safety_reason, **cached)
     
-    if not chatbot_instance:
-        raise HTTPException(status_code=400, detail="Chatbot not initialized")
+    lang = await asyncio.to_thread(language_support.analyze_for_chat, message)
+    # A failed translation comes back unchanged; don't pin that for two weeks
+    if lang.english != message or lang.code == 'en':
+        await translation_cache.put_cached_analysis(message, lang)
+    return lang
+
+async def _translate_response(text: str, target_lang: str, language_support: MultiLanguageSupport) -> str:
+    """process_multilingual_response through the translation cache"""
+    translated = await translation_cache.get_cached(text, target_lang)
+    if translated is None:
+        translated = await asyncio.to_thread(language_support.process_multilingual_response, text, target_lang)
+        if translated != text:
+            await translation_cache.put_cached(text, target_lang, translated)
+    return translated
+
+APOLOGY_EN = "I apologize, but I cannot provide that information. Please ask a different question."
+
+async def _preprocess(
+    message: str,
+    client_ip: str,
+    tag: str,
+    content_filter: ContentFilter,
+    language_support: MultiLanguageSupport
+) -> Tuple[str, LangResult]:
+    """
+    Language analysis and input filtering shared by the chat endpoints
+    Returns (english_message, lang); raises 400 if the message is blocked
+    """
+    # STEP 1: Process multi-language message. The English filter below waits
+    # for it: a moderation call started earlier can't be cancelled once its
+    # thread is running, so translated messages would pay for two.
+    lang = await _analyze_message(message, language_support)
+    english_message = lang.english
     
-    if not content_filter or not language_support:
-        raise HTTPException(status_code=400, detail="Content filter or language support not initialized")
+    # STEP 2: Check content safety in detected language
+    if not lang.is_safe:
+        moderation_logger.log_blocked_content("multilingual_message", lang.safety_reason, client_ip)
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Message blocked by content filter: {lang.safety_reason}"
+        )
+    
+    # STEP 3: Use English message for AI processing (english_message above)
+    
+    # STEP 4: Additional English content filtering, with categorization
+    # running concurrently instead of after the moderation round-trip
+    safety_task = asyncio.create_task(asyncio.to_thread(content_filter.check_text_content, english_message))
+    category_task = asyncio.create_task(asyncio.to_thread(content_filter.get_content_category, english_message))
+    is_safe, reason = await safety_task
+    if not is_safe:
+        category_task.cancel()
+        moderation_logger.log_blocked_content("translated_message", reason, client_ip)
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Message blocked by content filter: {reason}"
+        )
+    
+    # STEP 5: Categorize and log the request (with the detected language)
+    content_category = await category_task
+    moderation_logger.logger.info(
+        "%s: %s - %s (%s) - Confidence: %.2f - IP: %s",
+        tag, content_category, lang.name, lang.code, lang.confidence, client_ip
+    )
+    
+    return english_message, lang
+
+async def _apology_for(lang: str, language_support: MultiLanguageSupport) -> str:
+    """The fixed apology in the user's language, translated once per language"""
+    apologies = app.state.apology_translations
+    apology = apologies.get(lang)
+    if apology is None:
+        apology = await _translate_response(APOLOGY_EN, lang, language_support)
+        if apology != APOLOGY_EN:  # Retry later if the translation failed
+            apologies[lang] = apology
+    return apology
+
+async def _postprocess(
+    ai_response: str,
+    lang: LangResult,
+    client_ip: str,
+    tag: str,
+    content_filter: ContentFilter,
+    language_support: MultiLanguageSupport
+) -> str:
+    """
+    Output filtering and back-translation shared by the chat endpoints
+    The translation is started alongside the filter and only used if the response passes
+    """
+    detected_lang = lang.code
+    needs_translation = lang.needs_translation
+    
+    # Filter the AI response
+    response_check_task = asyncio.create_task(asyncio.to_thread(content_filter.check_text_content, ai_response))
+    translation_task = None
+    if needs_translation:
+        translation_task = asyncio.create_task(
+            _translate_response(ai_response, detected_lang, language_support)
+        )
+    
+    is_response_safe, response_reason = await response_check_task
+    if not is_response_safe:
+        if translation_task:
+            translation_task.cancel()
+        moderation_logger.log_suspicious_activity("ai_response_blocked", response_reason, client_ip)
+        if not needs_translation:
+            return APOLOGY_EN
+        return await _apology_for(detected_lang, language_support)
+    
+    if not needs_translation:
+        return ai_response
+    
+    # Translate response back to user's language
+    final_response = await translation_task
+    moderation_logger.logger.info("%s_TRANSLATED_RESPONSE: %s - IP: %s", tag, detected_lang, client_ip)
+    return final_response
+
+@app.post("/chat", response_model=ChatResponse, response_class=ORJSONResponse, response_model_exclude_unset=True)
+async def chat_with_bot(
+    request: ChatRequest,
+    http_request: Request,
+    chatbot_instance: ChatBot = Depends(get_bot),
+    content_filter: ContentFilter = Depends(get_content_filter),
+    language_support: MultiLanguageSupport = Depends(get_language_support)
+):
+    """Send a message to the chatbot with multi-language support and content filtering."""
+    response_cache = http_request.app.state.response_cache
     
     # Get client IP for logging
     client_ip = http_request.client.host
     
     try:
-        # STEP 1: Process multi-language message
-        lang_analysis = language_support.process_multilingual_chat(request.message)
-        
-        # Log language detection
-        detected_lang = lang_analysis['detected_language']
-        lang_name = lang_analysis['language_info']['name']
-        moderation_logger.logger.info(f"LANGUAGE: {lang_name} ({detected_lang}) - Confidence: {lang_analysis['confidence']:.2f} - IP: {client_ip}")
-        
-        # STEP 2: Check content safety in detected language
-        if not lang_analysis['is_safe']:
-            moderation_logger.log_blocked_content("multilingual_message", lang_analysis['safety_reason'], client_ip)
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Message blocked by content filter: {lang_analysis['safety_reason']}"
-            )
-        
-        # STEP 3: Use English message for AI processing
-        english_message = lang_analysis['english_message']
-        
-        # STEP 4: Additional English content filtering
-        is_safe, reason = content_filter.check_text_content(english_message)
-        if not is_safe:
-            moderation_logger.log_blocked_content("translated_message", reason, client_ip)
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Message blocked by content filter: {reason}"
-            )
-        
-        # STEP 5: Categorize and log the request
-        content_category = content_filter.get_content_category(english_message)
-        moderation_logger.logger.info(f"CHAT: {content_category} - {lang_name} - IP: {client_ip}")
-        
-        # STEP 6: Switch mode if needed
-        if chatbot_instance.current_mode != request.mode:
-            chatbot_instance.switch_mode(request.mode)
-        
-        # STEP 7: Get response from chatbot (using English message)
-        response = chatbot_instance.chat(english_message)
+        english_message, lang = await _preprocess(
+            request.message, client_ip, "CHAT", content_filter, language_support
+        )
         
-        # STEP 8: Filter the AI response
-        ai_response = response["response"]
-        is_response_safe, response_reason = content_filter.check_text_content(ai_response)
-        if not is_response_safe:
-            moderation_logger.log_suspicious_activity("ai_response_blocked", response_reason, client_ip)
-            ai_response = "I apologize, but I cannot provide that information. Please ask a different question."
+        # STEP 6: Get response from chatbot (using English message); the mode is
+        # passed per call so concurrent requests in different modes don't race.
+        # Repeated knowledge-base questions from the same client and session are
+        # served from the cache; hits are still recorded in memory, and go
+        # through the response filter and translation below. General-mode
+        # answers depend on the conversation so far and are never cached.
+        cache_scope = f"{client_ip}:{request.session_id}:{chatbot_instance.knowledge_base_hash}"
+        use_cache = request.use_cache and request.mode == "knowledge"
+        response = None
+        if use_cache:
+            response = await asyncio.to_thread(response_cache.get, cache_scope, request.mode, english_message)
+            if response is not None:
+                response = await asyncio.to_thread(chatbot_instance.record_turn, english_message, response)
+        if response is None:
+            response = await asyncio.to_thread(chatbot_instance.chat, english_message, mode=request.mode)
+            # Without a knowledge base chat() falls back to the general chain,
+            # so check what actually answered, not what was asked for
+            if use_cache and response["success"] and response["mode"] == "knowledge":
+                await asyncio.to_thread(response_cache.put, cache_scope, request.mode, english_message, response)
         
-        # STEP 9: Translate response back to user's language if needed
-        final_response = ai_response
-        if detected_lang != 'en' and lang_analysis['language_info'].get('auto_translate', False):
-            final_response = language_support.process_multilingual_response(ai_response, detected_lang)
-            moderation_logger.logger.info(f"TRANSLATED_RESPONSE: {detected_lang} - IP: {client_ip}")
+        # STEP 7-8: Filter the AI response and translate it back if needed
+        final_response = await _postprocess(
+            response["response"], lang, client_ip, "CHAT", content_filter, language_support
+        )
         
-        return ChatResponse(
+        _bump_state_version()
+        chat_response = ChatResponse(
             response=final_response,
             mode=response["mode"],
             sources=response.get("sources", []),
             timestamp=response["timestamp"],
             success=response["success"]
         )
+        return ORJSONResponse(
+            content=_chat_response_adapter.dump_python(chat_response, mode='json')
+        )
     except HTTPException:
         raise  # Re-raise HTTP exceptions
     except Exception as e:
         moderation_logger.log_suspicious_activity("multilingual_chat_error", str(e), client_ip)
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
-@app.post("/chat/enhanced")
-async def enhanced_chat_with_bot(request: EnhancedChatRequest, http_request: Request):
-    """Send a message to the MCP-enhanced chatbot with tool capabilities."""
-    global enhanced_chatbot_instance, content_filter, language_support, multilingual_filter
+# Sentence boundaries at which streamed output is filtered and released
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n+')
+
+def _sse(data: dict, event: Optional[str] = None) -> bytes:
+    """Encode one server-sent event."""
+    prefix = f"event: {event}\n".encode() if event else b""
+    return prefix + b"data: " + orjson.dumps(data) + b"\n\n"
+
+# Sent whenever a streamed sentence is blocked; the event never changes, so it
+# is encoded once instead of on every blocked sentence
+_SSE_BLOCKED = _sse({"reason": "Response blocked by content filter"}, event="blocked")
+
+async def _iterate_in_thread(make_iterator):
+    """Drive a blocking iterator in a worker thread and yield its items here."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
     
-    if not enhanced_chatbot_instance:
-        raise HTTPException(status_code=400, detail="Enhanced chatbot not initialized")
+    def produce():
+        try:
+            for item in make_iterator():
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
     
-    if not content_filter or not language_support:
-        raise HTTPException(status_code=400, detail="Content filter or language support not initialized")
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while (item := await queue.get()) is not done:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        await producer
+
+@app.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    http_request: Request,
+    chatbot_instance: ChatBot = Depends(get_bot),
+    content_filter: ContentFilter = Depends(get_content_filter),
+    language_support: MultiLanguageSupport = Depends(get_language_support)
+):
+    """Stream the chatbot reply as server-sent events, one filtered sentence at a time."""
+    client_ip = http_request.client.host
+    
+    # Input checks run before the stream opens so violations are plain 400s
+    english_message, lang = await _preprocess(
+        request.message, client_ip, "CHAT_STREAM", content_filter, language_support
+    )
+    detected_lang = lang.code
+    needs_translation = lang.needs_translation
+    
+    async def release(text: str) -> Optional[bytes]:
+        """Filter (and translate) a completed piece of the reply; None if blocked."""
+        is_text_safe, text_reason = await asyncio.to_thread(content_filter.check_text_content, text)
+        if not is_text_safe:
+            moderation_logger.log_suspicious_activity("ai_response_blocked", text_reason, client_ip)
+            return None
+        if needs_translation:
+            text = await _translate_response(text, detected_lang, language_support)
+        return _sse({"delta": text})
+    
+    async def events():
+        buffer = ""
+        try:
+            async for delta in _iterate_in_thread(lambda: chatbot_instance.stream_chat(english_message, mode=request.mode)):
+                buffer += delta
+                boundary = None
+                for boundary in _SENTENCE_END.finditer(buffer):
+                    pass
+                if boundary is None:
+                    continue
+                
+                complete, buffer = buffer[:boundary.end()], buffer[boundary.end():]
+                event = await release(complete)
+                if event is None:
+                    yield _SSE_BLOCKED
+                    return
+                yield event
+            
+            if buffer.strip():
+                event = await release(buffer)
+                if event is None:
+                    yield _SSE_BLOCKED
+                    return
+                yield event
+            
+            _bump_state_version()
+            yield _sse({"mode": request.mode, "language_code": detected_lang}, event="done")
+        except Exception as e:
+            moderation_logger.log_suspicious_activity("chat_stream_error", str(e), client_ip)
+            yield _sse({"error": str(e)}, event="error")
     
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/chat/enhanced")
+async def enhanced_chat_with_bot(
+    request: EnhancedChatRequest,
+    http_request: Request,
+    enhanced_chatbot_instance: MCPEnhancedChatBot = Depends(get_enhanced_bot),
+    content_filter: ContentFilter = Depends(get_content_filter),
+    language_support: MultiLanguageSupport = Depends(get_language_support)
+):
+    """Send a message to the MCP-enhanced chatbot with tool capabilities."""
     # Get client IP for logging
     client_ip = http_request.client.host
     
     try:
-        # STEP 1: Process multi-language message
-        lang_analysis = language_support.process_multilingual_chat(request.message)
-        
-        # Log language detection
-        detected_lang = lang_analysis['detected_language']
-        lang_name = lang_analysis['language_info']['name']
-        moderation_logger.logger.info(f"ENHANCED_CHAT_LANGUAGE: {lang_name} ({detected_lang}) - Confidence: {lang_analysis['confidence']:.2f} - IP: {client_ip}")
-        
-        # STEP 2: Check content safety in detected language
-        if not lang_analysis['is_safe']:
-            moderation_logger.log_blocked_content("multilingual_message", lang_analysis['safety_reason'], client_ip)
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Message blocked by content filter: {lang_analysis['safety_reason']}"
-            )
-        
-        # STEP 3: Use English message for AI processing
-        english_message = lang_analysis['english_message']
-        
-        # STEP 4: Additional English content filtering
-        is_safe, reason = content_filter.check_text_content(english_message)
-        if not is_safe:
-            moderation_logger.log_blocked_content("translated_message", reason, client_ip)
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Message blocked by content filter: {reason}"
-            )
-        
-        # STEP 5: Categorize and log the request
-        content_category = content_filter.get_content_category(english_message)
-        moderation_logger.logger.info(f"ENHANCED_CHAT: {content_category} - {lang_name} - IP: {client_ip}")
+        english_message, lang = await _preprocess(
+            request.message, client_ip, "ENHANCED_CHAT", content_filter, language_support
+        )
+        detected_lang = lang.code
+        lang_name = lang.name
         
         # STEP 6: Get response from enhanced chatbot with tools
         enhanced_response = await enhanced_chatbot_instance.chat_with_tools(
@@ -261,27 +763,21 @@ async def enhanced_chat_with_bot(request: EnhancedChatRequest, http_request: Req
             session_id=request.session_id
         )
         
-        # STEP 7: Filter the AI response
-        ai_response = enhanced_response["response"]
-        is_response_safe, response_reason = content_filter.check_text_content(ai_response)
-        if not is_response_safe:
-            moderation_logger.log_suspicious_activity("ai_response_blocked", response_reason, client_ip)
-            ai_response = "I apologize, but I cannot provide that information. Please ask a different question."
-            enhanced_response["response"] = ai_response
+        # STEP 7-8: Filter the AI response and translate it back if needed
+        enhanced_response["response"] = await _postprocess(
+            enhanced_response["response"], lang, client_ip, "ENHANCED_CHAT", content_filter, language_support
+        )
         
-        # STEP 8: Translate response back to user's language if needed
-        final_response = ai_response
-        if detected_lang != 'en' and lang_analysis['language_info'].get('auto_translate', False):
-            final_response = language_support.process_multilingual_response(ai_response, detected_lang)
-            moderation_logger.logger.info(f"ENHANCED_TRANSLATED_RESPONSE: {detected_lang} - IP: {client_ip}")
-            enhanced_response["response"] = final_response
+        _bump_state_version()
         
         # Log tool usage if tools were used
         if enhanced_response.get("enhanced", False):
             tools_used = enhanced_response.get("tools_used", [])
-            moderation_logger.logger.info(f"MCP_TOOLS_USED: {', '.join(tools_used)} - {lang_name} - IP: {client_ip}")
+            moderation_logger.logger.info("MCP_TOOLS_USED: %s - %s - IP: %s", tools_used, lang_name, client_ip)
         
-        return {
+        # Returned as a Response so FastAPI skips jsonable_encoder over the
+        # nested tool_results; orjson serializes them directly
+        return ORJSONResponse({
             "success": True,
             "response": enhanced_response["response"],
             "enhanced": enhanced_response.get("enhanced", False),
@@ -291,7 +787,7 @@ async def enhanced_chat_with_bot(request: EnhancedChatRequest, http_request: Req
             "timestamp": enhanced_response.get("timestamp"),
             "language_detected": lang_name,
             "language_code": detected_lang
-        }
+        })
         
     except HTTPException:
         raise  # Re-raise HTTP exceptions
@@ -300,51 +796,23 @@ async def enhanced_chat_with_bot(request: EnhancedChatRequest, http_request: Req
         raise HTTPException(status_code=500, detail=f"Enhanced chat error: {str(e)}")
 
 @app.post("/chat/agent")
-async def agent_chat_with_bot(request: AgentChatRequest, http_request: Request):
+async def agent_chat_with_bot(
+    request: AgentChatRequest,
+    http_request: Request,
+    agent_chatbot_instance: AIAgentChatBot = Depends(get_agent_bot),
+    content_filter: ContentFilter = Depends(get_content_filter),
+    language_support: MultiLanguageSupport = Depends(get_language_support)
+):
     """Send a message to the AI Agent chatbot for intelligent multi-step problem solving."""
-    global agent_chatbot_instance, content_filter, language_support, multilingual_filter
-    
-    if not agent_chatbot_instance:
-        raise HTTPException(status_code=400, detail="AI Agent chatbot not initialized")
-    
-    if not content_filter or not language_support:
-        raise HTTPException(status_code=400, detail="Content filter or language support not initialized")
-    
     # Get client IP for logging
     client_ip = http_request.client.host
     
     try:
-        # STEP 1: Process multi-language message
-        lang_analysis = language_support.process_multilingual_chat(request.message)
-        
-        # Log language detection
-        detected_lang = lang_analysis['detected_language']
-        lang_name = lang_analysis['language_info']['name']
-        moderation_logger.logger.info(f"AGENT_CHAT_LANGUAGE: {lang_name} ({detected_lang}) - Confidence: {lang_analysis['confidence']:.2f} - IP: {client_ip}")
-        
-        # STEP 2: Check content safety in detected language
-        if not lang_analysis['is_safe']:
-            moderation_logger.log_blocked_content("multilingual_message", lang_analysis['safety_reason'], client_ip)
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Message blocked by content filter: {lang_analysis['safety_reason']}"
-            )
-        
-        # STEP 3: Use English message for AI processing
-        english_message = lang_analysis['english_message']
-        
-        # STEP 4: Additional English content filtering
-        is_safe, reason = content_filter.check_text_content(english_message)
-        if not is_safe:
-            moderation_logger.log_blocked_content("translated_message", reason, client_ip)
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Message blocked by content filter: {reason}"
-            )
-        
-        # STEP 5: Categorize and log the request
-        content_category = content_filter.get_content_category(english_message)
-        moderation_logger.logger.info(f"AGENT_CHAT: {content_category} - {lang_name} - IP: {client_ip}")
+        english_message, lang = await _preprocess(
+            request.message, client_ip, "AGENT_CHAT", content_filter, language_support
+        )
+        detected_lang = lang.code
+        lang_name = lang.name
         
         # STEP 6: Get response from AI agent with intelligent planning
         agent_response = await agent_chatbot_instance.chat_with_agent(
@@ -352,29 +820,23 @@ async def agent_chat_with_bot(request: AgentChatRequest, http_request: Request):
             session_id=request.session_id
         )
         
-        # STEP 7: Filter the AI response
-        ai_response = agent_response["response"]
-        is_response_safe, response_reason = content_filter.check_text_content(ai_response)
-        if not is_response_safe:
-            moderation_logger.log_suspicious_activity("ai_response_blocked", response_reason, client_ip)
-            ai_response = "I apologize, but I cannot provide that information. Please ask a different question."
-            agent_response["response"] = ai_response
-        
-        # STEP 8: Translate response back to user's language if needed
-        final_response = ai_response
-        if detected_lang != 'en' and lang_analysis['language_info'].get('auto_translate', False):
-            final_response = language_support.process_multilingual_response(ai_response, detected_lang)
-            moderation_logger.logger.info(f"AGENT_TRANSLATED_RESPONSE: {detected_lang} - IP: {client_ip}")
-            agent_response["response"] = final_response
+        # STEP 7-8: Filter the AI response and translate it back if needed
+        agent_response["response"] = await _postprocess(
+            agent_response["response"], lang, client_ip, "AGENT_CHAT", content_filter, language_support
+        )
         
         # Log agent usage
         if agent_response.get("agent_used", False):
             agent_role = agent_response.get("agent_role", "unknown")
             steps_completed = agent_response.get("steps_completed", 0)
             tools_used = agent_response.get("tools_used", [])
-            moderation_logger.logger.info(f"AI_AGENT_USED: {agent_role} - {steps_completed} steps - Tools: {', '.join(tools_used)} - {lang_name} - IP: {client_ip}")
+            moderation_logger.logger.info(
+                "AI_AGENT_USED: %s - %s steps - Tools: %s - %s - IP: %s",
+                agent_role, steps_completed, tools_used, lang_name, client_ip
+            )
         
-        return {
+        # Returned as a Response so FastAPI skips jsonable_encoder over the plan
+        return ORJSONResponse({
             "success": True,
             "response": agent_response["response"],
             "agent_used": agent_response.get("agent_used", False),
@@ -387,7 +849,7 @@ async def agent_chat_with_bot(request: AgentChatRequest, http_request: Request):
             "timestamp": agent_response.get("timestamp"),
             "language_detected": lang_name,
             "language_code": detected_lang
-        }
+        })
         
     except HTTPException:
         raise  # Re-raise HTTP exceptions
@@ -396,119 +858,199 @@ async def agent_chat_with_bot(request: AgentChatRequest, http_request: Request):
         raise HTTPException(status_code=500, detail=f"AI Agent chat error: {str(e)}")
 
 @app.post("/load-knowledge")
-async def load_knowledge_base(files: List[UploadFile] = File(...), http_request: Request = None):
+async def load_knowledge_base(
+    http_request: Request,
+    files: List[UploadFile] = File(...),
+    chatbot_instance: ChatBot = Depends(get_bot),
+    content_filter: ContentFilter = Depends(get_content_filter),
+    language_support: MultiLanguageSupport = Depends(get_language_support)
+):
     """Load knowledge base from uploaded files with multi-language support and content filtering."""
-    global chatbot_instance, content_filter, language_support
-    
-    if not chatbot_instance:
-        raise HTTPException(status_code=400, detail="Chatbot not initialized")
-    
-    if not content_filter or not language_support:
-        raise HTTPException(status_code=400, detail="Content filter or language support not initialized")
-    
     # Get client IP for logging
-    client_ip = http_request.client.host if http_request else "unknown"
+    client_ip = http_request.client.host
     
+    # All processed files go into one per-request directory, removed in one
+    # call when the request finishes however it ends
+    temp_dir = await asyncio.to_thread(tempfile.mkdtemp, prefix="kb_")
+    temp_files = []
     try:
         # Check file count limit
-        if len(files) > 10:
-            raise HTTPException(status_code=400, detail="Maximum 10 files allowed per upload")
+        if len(files) > MAX_UPLOAD_FILES:
+            raise HTTPException(status_code=400, detail=TOO_MANY_FILES_DETAIL)
         
-        temp_files = []
         total_size = 0
-        processed_files_info = []
+        new_fingerprints = set()
+        duplicate_files = []
+        
+        async def process_one(index: int, file: UploadFile) -> Optional[dict]:
+            """Scan, validate and stage one upload; None if it is a duplicate."""
+            nonlocal total_size
+            # Sanitize once; the extension drives both the scan and the temp file suffix
+            safe_filename = content_filter.sanitize_filename(file.filename)
+            file_ext = os.path.splitext(safe_filename)[1].lower()
+        
+            # Stream file content in chunks, rejecting the upload as soon as
+            # the total size limit is crossed instead of after a full read.
+            # Only the decoded text and the first few bytes are kept.
+            file_size = 0
+            head = b""
+            # Text is decoded incrementally as chunks arrive; a multi-byte
+            # character split across chunks is carried over by the decoder
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+            text_parts = []
+            # Plain-text uploads are pre-scanned for blocked terms as they
+            # stream in, so an offending file is rejected on the first hit
+            scan_text = file_ext in content_filter.text_extensions
+            scan_tail = b""
+            # Fingerprint the raw upload as it streams (OpenSSL SHA-256)
+            hasher = hashlib.sha256()
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                total_size += len(chunk)
+                if total_size > MAX_TOTAL_UPLOAD_BYTES:
+                    raise HTTPException(status_code=400, detail=UPLOAD_TOO_LARGE_DETAIL)
+                if scan_text:
+                    blocked_reason, scan_tail = await asyncio.to_thread(content_filter.scan_upload_chunk, chunk, scan_tail)
+                    if blocked_reason:
+                        moderation_logger.log_blocked_content("file_upload", f"{file.filename}: {blocked_reason}", client_ip)
+                        raise HTTPException(status_code=400, detail=f"File '{file.filename}' contains inappropriate content: {blocked_reason}")
+                if len(head) < UPLOAD_HEAD_BYTES:
+                    head += chunk[:UPLOAD_HEAD_BYTES - len(head)]
+                file_size += len(chunk)
+                hasher.update(chunk)
+                text_parts.append(decoder.decode(chunk))
+            text_parts.append(decoder.decode(b"", final=True))
+            text_content = "".join(text_parts)
+            del text_parts
+        
+            # Identical files already in the knowledge base are not reprocessed
+            fingerprint = hasher.hexdigest()
+            if fingerprint in chatbot_instance.knowledge_fingerprints or fingerprint in new_fingerprints:
+                moderation_logger.log_file_upload(file.filename, file_size, "duplicate_skipped", client_ip)
+                duplicate_files.append(file.filename)
+                return None
+            new_fingerprints.add(fingerprint)
         
-        for file in files:
-            # Read file content
-            content = await file.read()
-            file_size = len(content)
-            total_size += file_size
-            
             # Log file upload attempt
             moderation_logger.log_file_upload(file.filename, file_size, "processing", client_ip)
+        
+            # STEP 1 and 2 are independent: basic file validation runs while
+            # the document language is analysed (and translated if needed)
+            file_check_task = asyncio.create_task(asyncio.to_thread(
+                content_filter.check_streamed_upload, file.filename, file_size, head,
+                text_content if file_ext in content_filter.text_extensions else None
+            ))
+            doc_task = asyncio.create_task(
+                asyncio.to_thread(language_support.validate_document_language, text_content, file.filename)
+            )
             
             # STEP 1: Basic file validation
-            is_file_safe, file_reason = content_filter.check_file_upload(file.filename, content)
+            is_file_safe, file_reason = await file_check_task
             if not is_file_safe:
+                doc_task.cancel()
                 moderation_logger.log_blocked_content("file_upload", f"{file.filename}: {file_reason}", client_ip)
                 raise HTTPException(status_code=400, detail=f"File '{file.filename}' rejected: {file_reason}")
             
             # STEP 2: Process multi-language document content
             try:
-                text_content = content.decode('utf-8', errors='ignore')
-                
-                # Analyze document language
-                doc_analysis = language_support.validate_document_language(text_content, file.filename)
-                
-                detected_lang = doc_analysis['detected_language']
-                lang_name = doc_analysis['language_info']['name']
-                
-                # Log document language
-                moderation_logger.logger.info(f"DOCUMENT_LANGUAGE: {file.filename} - {lang_name} ({detected_lang}) - Confidence: {doc_analysis['confidence']:.2f} - IP: {client_ip}")
-                
-                # Check content safety in detected language
-                if not doc_analysis['is_safe']:
-                    moderation_logger.log_blocked_content("multilingual_document", f"{file.filename}: {doc_analysis['safety_reason']}", client_ip)
-                    raise HTTPException(status_code=400, detail=f"File '{file.filename}' contains inappropriate content: {doc_analysis['safety_reason']}")
-                
-                # STEP 3: Use English content for knowledge base (translated if needed)
-                final_content = doc_analysis['english_content']
-                
-                # Additional safety check on English content
-                is_content_safe, content_reason = content_filter.check_knowledge_base_content(final_content)
-                if not is_content_safe:
-                    moderation_logger.log_blocked_content("translated_document", f"{file.filename}: {content_reason}", client_ip)
-                    raise HTTPException(status_code=400, detail=f"File '{file.filename}' contains inappropriate content: {content_reason}")
-                
-                processed_files_info.append({
-                    'filename': file.filename,
-                    'original_language': lang_name,
-                    'language_code': detected_lang,
-                    'translated': doc_analysis['needs_translation'],
-                    'original_size': doc_analysis['content_length'],
-                    'processed_size': doc_analysis['english_length']
-                })
-                
-            except UnicodeDecodeError as e:
-                moderation_logger.log_blocked_content("file_decode_error", f"{file.filename}: {str(e)}", client_ip)
-                raise HTTPException(status_code=400, detail=f"Could not process file '{file.filename}': Invalid text encoding")
+                doc_analysis = await doc_task
             except Exception as e:
                 moderation_logger.log_blocked_content("file_processing_error", f"{file.filename}: {str(e)}", client_ip)
                 raise HTTPException(status_code=400, detail=f"Could not process file '{file.filename}': {str(e)}")
             
-            # STEP 4: Sanitize filename and create temporary file
-            safe_filename = content_filter.sanitize_filename(file.filename)
+            detected_lang = doc_analysis['detected_language']
+            lang_name = doc_analysis['language_info']['name']
+            
+            # Log document language
+            moderation_logger.logger.info(
+                "DOCUMENT_LANGUAGE: %s - %s (%s) - Confidence: %.2f - IP: %s",
+                file.filename, lang_name, detected_lang, doc_analysis['confidence'], client_ip
+            )
+            
+            # Check content safety in detected language
+            if not doc_analysis['is_safe']:
+                moderation_logger.log_blocked_content("multilingual_document", f"{file.filename}: {doc_analysis['safety_reason']}", client_ip)
+                raise HTTPException(status_code=400, detail=f"File '{file.filename}' contains inappropriate content: {doc_analysis['safety_reason']}")
             
-            with tempfile.NamedTemporaryFile(mode="wb", delete=False, suffix=os.path.splitext(safe_filename)[1]) as temp_file:
-                # Write the processed (possibly translated) content
-                temp_file.write(final_content.encode('utf-8'))
-                temp_files.append(temp_file.name)
+            # STEP 3: Use English content for knowledge base (translated if needed)
+            final_content = doc_analysis['english_content']
+            
+            # STEP 4: Write into the request's temp directory (filename was
+            # sanitized above; the index keeps same-named uploads apart) while
+            # the English content gets its additional safety check. A file
+            # that fails the check is removed with the directory.
+            temp_path = os.path.join(temp_dir, f"{index}_{safe_filename}")
+            temp_files.append(temp_path)
+            
+            async def write_temp_file():
+                async with aiofiles.open(temp_path, mode="w", encoding="utf-8") as temp_file:
+                    await temp_file.write(final_content)
+            
+            (is_content_safe, content_reason), _ = await asyncio.gather(
+                asyncio.to_thread(content_filter.check_knowledge_base_content, final_content),
+                write_temp_file()
+            )
+            if not is_content_safe:
+                moderation_logger.log_blocked_content("translated_document", f"{file.filename}: {content_reason}", client_ip)
+                raise HTTPException(status_code=400, detail=f"File '{file.filename}' contains inappropriate content: {content_reason}")
+            
+            return {
+                'filename': file.filename,
+                'original_language': lang_name,
+                'language_code': detected_lang,
+                'translated': doc_analysis['needs_translation'],
+                'original_size': doc_analysis['content_length'],
+                'processed_size': doc_analysis['english_length']
+            }
+    
+        # Files are independent, so they are checked concurrently; the
+        # semaphore keeps a large batch from flooding the OpenAI API
+        semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
         
-        # Check total upload size
-        if total_size > 50 * 1024 * 1024:  # 50MB total limit
-            raise HTTPException(status_code=400, detail="Total file size exceeds 50MB limit")
+        async def bounded(index: int, file: UploadFile) -> Optional[dict]:
+            async with semaphore:
+                return await process_one(index, file)
         
-        # STEP 5: Load knowledge base with processed files
-        success = chatbot_instance.load_knowledge_base(temp_files)
+        # Every task finishes before an error is raised, so nothing is still
+        # writing into the temp directory when it is removed
+        results = await asyncio.gather(*(bounded(i, file) for i, file in enumerate(files)), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        processed_files_info = [info for info in results if info is not None]
         
-        # STEP 6: Clean up temporary files
-        for temp_file in temp_files:
-            try:
-                os.unlink(temp_file)
-            except OSError:
-                pass  # File might already be deleted
+        if not temp_files:
+            return {
+                "success": True,
+                "message": "All files are already in the knowledge base",
+                "files_processed": 0,
+                "files_skipped": len(duplicate_files),
+                "total_size_mb": round(total_size / (1024*1024), 2),
+                "languages_detected": [],
+                "files_translated": 0,
+                "file_details": []
+            }
+        
+        # STEP 5: Load knowledge base with processed files
+        success = await asyncio.to_thread(chatbot_instance.load_knowledge_base, temp_files)
         
         if success:
+            chatbot_instance.knowledge_fingerprints.update(new_fingerprints)
+            _bump_state_version()
+            
             # Log successful processing with language details
             languages_processed = list(set(info['original_language'] for info in processed_files_info))
             translated_count = sum(1 for info in processed_files_info if info['translated'])
             
-            moderation_logger.logger.info(f"KNOWLEDGE_BASE_LOADED: {len(files)} files - Languages: {', '.join(languages_processed)} - {translated_count} translated - IP: {client_ip}")
+            moderation_logger.logger.info(
+                "KNOWLEDGE_BASE_LOADED: %d files - Languages: %s - %d translated - IP: %s",
+                len(temp_files), languages_processed, translated_count, client_ip
+            )
             
             return {
                 "success": True, 
-                "message": f"Successfully loaded {len(files)} files into knowledge base",
-                "files_processed": len(files),
+                "message": f"Successfully loaded {len(temp_files)} files into knowledge base",
+                "files_processed": len(temp_files),
+                "files_skipped": len(duplicate_files),
                 "total_size_mb": round(total_size / (1024*1024), 2),
                 "languages_detected": languages_processed,
                 "files_translated": translated_count,
@@ -518,42 +1060,43 @@ async def load_knowledge_base(files: List[UploadFile] = File(...), http_request:
             raise HTTPException(status_code=500, detail="Failed to load knowledge base")
             
     except HTTPException:
-        # Clean up temp files on error
-        for temp_file in temp_files:
-            try:
-                os.unlink(temp_file)
-            except OSError:
-                pass
         raise  # Re-raise HTTP exceptions
     except Exception as e:
-        # Clean up temp files on error
-        for temp_file in temp_files:
-            try:
-                os.unlink(temp_file)
-            except OSError:
-                pass
         moderation_logger.log_suspicious_activity("multilingual_file_upload_error", str(e), client_ip)
         raise HTTPException(status_code=500, detail=f"Upload error: {str(e)}")
+    finally:
+        # STEP 6: Clean up temporary files
+        await asyncio.to_thread(shutil.rmtree, temp_dir, ignore_errors=True)
 
 @app.post("/clear-memory")
-async def clear_memory():
+async def clear_memory(chatbot_instance: ChatBot = Depends(get_bot)):
     """Clear chatbot memory."""
-    global chatbot_instance
-    
-    if not chatbot_instance:
-        raise HTTPException(status_code=400, detail="Chatbot not initialized")
-    
     try:
-        chatbot_instance.clear_memory()
+        await asyncio.to_thread(chatbot_instance.clear_memory)
+        _bump_state_version()
         return {"success": True, "message": "Memory cleared successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Memory clear error: {str(e)}")
 
-@app.get("/status")
-async def get_status():
-    """Get chatbot status."""
-    global chatbot_instance
-    
+@app.post("/memory/prune")
+async def prune_memory(chatbot_instance: ChatBot = Depends(get_bot)):
+    """Summarize older conversation turns to shrink the prompt."""
+    try:
+        stats = await asyncio.to_thread(chatbot_instance.prune_memory)
+        _bump_state_version()
+        return {"success": True, **stats}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Memory prune error: {str(e)}")
+
+@app.post("/content-filter/clear-cache")
+async def clear_content_filter_cache(content_filter: ContentFilter = Depends(get_content_filter)):
+    """Drop cached content filter verdicts (e.g. after changing blocklists)."""
+    content_filter.clear_check_cache()
+    return {"success": True, "message": "Content filter cache cleared"}
+
+@_cached_body()
+async def _status_payload(chatbot_instance: Optional[ChatBot]) -> dict:
+    """Body of /status."""
     if not chatbot_instance:
         return {
             "chatbot_ready": False,
@@ -561,147 +1104,128 @@ async def get_status():
             "knowledge_loaded": False,
             "memory_summary": "Chatbot not initialized"
         }
-    
     return {
         "chatbot_ready": True,
         "current_mode": chatbot_instance.current_mode,
         "knowledge_loaded": chatbot_instance.knowledge_chain is not None,
-        "memory_summary": chatbot_instance.get_memory_summary()
+        "memory_summary": await asyncio.to_thread(chatbot_instance.get_memory_summary),
+        "response_cache": app.state.response_cache.stats() if app.state.response_cache else None
     }
 
-@app.get("/chat-history")
-async def get_chat_history():
-    """Get chat history."""
-    global chatbot_instance
-    
-    if not chatbot_instance:
-        raise HTTPException(status_code=400, detail="Chatbot not initialized")
+@app.get("/status")
+async def get_status(http_request: Request):
+    """Get chatbot status."""
+    body = await _status_payload(http_request.app.state.chatbot)
     
+    # Status changes rarely; let pollers revalidate with If-None-Match
+    etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=1"}
+    if http_request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@_cached_body()
+async def _chat_history_payload(chatbot_instance: ChatBot) -> dict:
+    """Body of /chat-history."""
     return {"history": chatbot_instance.get_chat_history()}
 
-@app.post("/search-knowledge")
-async def search_knowledge_base(request: ChatRequest):
+@app.get("/chat-history")
+async def get_chat_history(chatbot_instance: ChatBot = Depends(get_bot)):
+    """Get chat history."""
+    return Response(content=await _chat_history_payload(chatbot_instance), media_type="application/json")
+
+@app.post("/search-knowledge", response_class=ORJSONResponse)
+async def search_knowledge_base(request: ChatRequest, chatbot_instance: ChatBot = Depends(get_bot)):
     """Search the knowledge base directly."""
-    global chatbot_instance
-    
-    if not chatbot_instance:
-        raise HTTPException(status_code=400, detail="Chatbot not initialized")
-    
     if not chatbot_instance.knowledge_chain:
         raise HTTPException(status_code=400, detail="Knowledge base not loaded")
     
     try:
-        results = chatbot_instance.search_knowledge_base(request.message, k=5)
+        results = await asyncio.to_thread(chatbot_instance.search_knowledge_base, request.message, k=5)
         return {"results": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
 
 @app.get("/tools/available")
-async def get_available_tools():
+async def get_available_tools(enhanced_chatbot_instance: MCPEnhancedChatBot = Depends(get_enhanced_bot)):
     """Get list of available MCP tools."""
-    global enhanced_chatbot_instance
-    
-    if not enhanced_chatbot_instance:
-        raise HTTPException(status_code=400, detail="Enhanced chatbot not initialized")
-    
-    return {
+    return ORJSONResponse({
         "tools": enhanced_chatbot_instance.get_available_tools(),
         "usage_stats": enhanced_chatbot_instance.get_tool_usage_stats()
+    })
+
+@_cached_body()
+async def _tool_usage_payload(enhanced_chatbot_instance: MCPEnhancedChatBot) -> dict:
+    """Body of /tools/usage-stats."""
+    stats = enhanced_chatbot_instance.get_tool_usage_stats()
+    return {
+        "tool_usage_stats": stats,
+        "total_tool_calls": sum(stats.values())
     }
 
 @app.get("/tools/usage-stats")
-async def get_tool_usage_stats():
+async def get_tool_usage_stats(enhanced_chatbot_instance: MCPEnhancedChatBot = Depends(get_enhanced_bot)):
     """Get tool usage statistics."""
-    global enhanced_chatbot_instance
-    
-    if not enhanced_chatbot_instance:
-        raise HTTPException(status_code=400, detail="Enhanced chatbot not initialized")
-    
-    return {
-        "tool_usage_stats": enhanced_chatbot_instance.get_tool_usage_stats(),
-        "total_tool_calls": sum(enhanced_chatbot_instance.get_tool_usage_stats().values())
-    }
+    return Response(content=await _tool_usage_payload(enhanced_chatbot_instance), media_type="application/json")
 
-@app.get("/agents/available")
+@app.get("/agents/available", dependencies=[Depends(get_agent_bot)])
 async def get_available_agents():
     """Get list of available AI agents."""
-    global agent_chatbot_instance
-    
-    if not agent_chatbot_instance:
-        raise HTTPException(status_code=400, detail="AI Agent chatbot not initialized")
-    
-    return {
-        "agents": [
-            {
-                "name": "customer_support",
-                "description": "Handles customer service issues and complaints",
-                "capabilities": ["issue analysis", "resolution planning", "follow-up creation"]
-            },
-            {
-                "name": "data_analyst", 
-                "description": "Analyzes data and provides business insights",
-                "capabilities": ["data analysis", "trend identification", "recommendations"]
-            },
-            {
-                "name": "research_agent",
-                "description": "Conducts comprehensive research and information gathering",
-                "capabilities": ["web research", "competitive analysis", "report generation"]
-            },
-            {
-                "name": "project_manager",
-                "description": "Creates and manages project plans and timelines",
-                "capabilities": ["project planning", "timeline creation", "resource allocation"]
-            },
-            {
-                "name": "task_planner",
-                "description": "Plans and executes general multi-step tasks",
-                "capabilities": ["task breakdown", "execution planning", "workflow automation"]
-            }
-        ]
-    }
+    return {"agents": AVAILABLE_AGENTS_RESPONSE}
 
 @app.get("/agents/stats")
-async def get_agent_stats():
+async def get_agent_stats(agent_chatbot_instance: AIAgentChatBot = Depends(get_agent_bot)):
     """Get AI agent performance statistics."""
-    global agent_chatbot_instance
-    
-    if not agent_chatbot_instance:
-        raise HTTPException(status_code=400, detail="AI Agent chatbot not initialized")
-    
-    return {
+    # Returned as a Response so FastAPI skips jsonable_encoder over the stats
+    return ORJSONResponse({
         "agent_stats": agent_chatbot_instance.get_agent_stats(),
         "message": "AI Agent performance metrics"
-    }
+    })
+
+# The root payload never changes, so it is built and serialized once at import
+_ROOT_PAYLOAD = {
+    "message": "ChatBot API is running with MCP Tools",
+    "version": "2.0.0",
+    "features": [
+        "Multi-language support",
+        "Content filtering",
+        "MCP tool integration",
+        "Real-time data access"
+    ],
+    "endpoints": [
+        "/initialize - Initialize chatbot with API key",
+        "/chat - Send message to standard chatbot", 
+        "/chat/stream - Stream the standard chatbot reply as server-sent events",
+        "/chat/enhanced - Send message to MCP-enhanced chatbot with tools",
+        "/chat/agent - Send message to AI Agent for intelligent multi-step problem solving",
+        "/tools/available - Get list of available MCP tools",
+        "/tools/usage-stats - Get tool usage statistics",
+        "/agents/available - Get list of available AI agents",
+        "/agents/stats - Get AI agent performance statistics",
+        "/load-knowledge - Upload knowledge base files",
+        "/clear-memory - Clear conversation memory",
+        "/status - Get chatbot status",
+        "/chat-history - Get conversation history",
+        "/search-knowledge - Search knowledge base"
+    ]
+}
+_ROOT_BYTES = orjson.dumps(_ROOT_PAYLOAD)
 
 @app.get("/")
 async def root():
     """API root endpoint."""
-    return {
-        "message": "ChatBot API is running with MCP Tools",
-        "version": "2.0.0",
-        "features": [
-            "Multi-language support",
-            "Content filtering",
-            "MCP tool integration",
-            "Real-time data access"
-        ],
-        "endpoints": [
-            "/initialize - Initialize chatbot with API key",
-            "/chat - Send message to standard chatbot", 
-            "/chat/enhanced - Send message to MCP-enhanced chatbot with tools",
-            "/chat/agent - Send message to AI Agent for intelligent multi-step problem solving",
-            "/tools/available - Get list of available MCP tools",
-            "/tools/usage-stats - Get tool usage statistics",
-            "/agents/available - Get list of available AI agents",
-            "/agents/stats - Get AI agent performance statistics",
-            "/load-knowledge - Upload knowledge base files",
-            "/clear-memory - Clear conversation memory",
-            "/status - Get chatbot status",
-            "/chat-history - Get conversation history",
-            "/search-knowledge - Search knowledge base"
-        ]
-    }
+    return Response(content=_ROOT_BYTES, media_type="application/json")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    # "auto" picks uvloop when it is installed (it is not on Windows);
+    # httptools is a hard requirement on every platform
+    uvicorn.run(
+        "backend.server:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="auto",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        proxy_headers=True,
+    )
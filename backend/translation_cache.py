@@ -0,0 +1,100 @@
+"""
+Translation Cache for AI ChatBot
+Avoids re-translating (and re-analysing) text that has been seen before
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import orjson
+
+from backend.middleware import async_redis_client
+from backend.language_support import LangResult
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+TRANSLATION_TTL_SECONDS = 14 * 24 * 3600
+
+# LangResult fields kept for an inbound message. The moderation verdict is
+# left out so it is always re-checked against the current filter settings
+ANALYSIS_FIELDS = ("english", "code", "name", "confidence", "auto_translate")
+MAX_LOCAL_ENTRIES = 4096
+
+# Tier 1: in-process LRU shared by both key families
+_local = OrderedDict()
+_lock = threading.Lock()
+
+def _digest(text: str) -> str:
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+def _translation_key(text: str, dst: str) -> str:
+    return f"translate:v1:{_digest(text)}:{dst}"
+
+def _analysis_key(text: str) -> str:
+    return f"lang:v3:{_digest(text)}"
+
+def _local_get(key: str):
+    with _lock:
+        value = _local.get(key)
+        if value is not None:
+            _local.move_to_end(key)
+        return value
+
+def _local_put(key: str, value):
+    with _lock:
+        _local[key] = value
+        _local.move_to_end(key)
+        while len(_local) > MAX_LOCAL_ENTRIES:
+            _local.popitem(last=False)
+
+async def _get(key: str):
+    """Look a key up in memory, then Redis (Redis errors count as a miss)"""
+    value = _local_get(key)
+    if value is not None or async_redis_client is None:
+        return value
+    try:
+        stored = await async_redis_client.get(key)
+    except Exception as e:
+        logger.warning(f"Translation cache Redis lookup failed: {e}")
+        return None
+    if stored is None:
+        return None
+    value = orjson.loads(stored)
+    _local_put(key, value)
+    return value
+
+async def _put(key: str, value):
+    _local_put(key, value)
+    if async_redis_client is None:
+        return
+    try:
+        await async_redis_client.set(key, orjson.dumps(value), ex=TRANSLATION_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Translation cache Redis store failed: {e}")
+
+async def get_cached(text: str, dst: str) -> Optional[str]:
+    """Cached translation of text into dst, or None"""
+    return await _get(_translation_key(text, dst))
+
+async def put_cached(text: str, dst: str, value: str):
+    """Remember the translation of text into dst"""
+    await _put(_translation_key(text, dst), value)
+
+async def get_cached_analysis(text: str) -> Optional[Dict[str, Any]]:
+    """Cached language detection/translation for an inbound message (ANALYSIS_FIELDS), or None"""
+    stored = await _get(_analysis_key(text))
+    return dict(zip(ANALYSIS_FIELDS, stored)) if stored is not None else None
+
+async def put_cached_analysis(text: str, analysis: LangResult):
+    """Remember the language detection/translation for an inbound message"""
+    # Stored as a plain list (JSON array) in ANALYSIS_FIELDS order
+    await _put(_analysis_key(text), [getattr(analysis, field) for field in ANALYSIS_FIELDS])
+
+def clear():
+    """Drop all in-process entries"""
+    with _lock:
+        _local.clear()
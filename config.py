@@ -1,9 +1,24 @@
 # ChatBot Configuration Settings
 # Modify these values to customize your chatbot behavior
 
+from bisect import bisect_left
+from types import MappingProxyType
+
+# Upper bounds (inclusive) of each memory usage band, and the band labels
+_MEMORY_USAGE_THRESHOLDS = (10, 30, 60)
+_MEMORY_USAGE_LABELS = (
+    "Low memory usage",
+    "Medium memory usage",
+    "High memory usage",
+    "Very high memory usage"
+)
+
 class ChatBotConfig:
     """Configuration settings for the AI ChatBot"""
     
+    # Settings live on the class; no per-instance state
+    __slots__ = ()
+    
     # ===========================================
     # MEMORY SETTINGS
     # ===========================================
@@ -13,6 +28,20 @@ class ChatBotConfig:
     # Higher values = more context, better conversations
     MEMORY_WINDOW = 20  # Default: 10, Recommended: 10-50
     
+    # Token budget for remembered messages; once memory grows past it the
+    # oldest turns are evicted (or summarized, see below) before the next reply
+    MEMORY_TOKEN_BUDGET = 2048  # Default: 2048, Range: 512-8192
+    
+    # Summarize turns pushed out of the budget instead of dropping them
+    # (off by default: it adds a blocking LLM call to the reply that evicts)
+    MEMORY_SUMMARIZE_EVICTED = False
+    
+    # Cheaper/faster model used only to write those summaries
+    MEMORY_SUMMARY_MODEL = "gpt-3.5-turbo"
+    
+    # Most recent conversation pairs that are never evicted or summarized
+    MEMORY_KEEP_RECENT = 4  # Default: 4, Range: 1-10
+    
     # ===========================================
     # AI BEHAVIOR SETTINGS  
     # ===========================================
@@ -51,27 +80,32 @@ class ChatBotConfig:
     # ===========================================
     
     # Quick presets for different use cases
-    MEMORY_PRESETS = {
+    MEMORY_PRESETS = MappingProxyType({
         "minimal": 5,      # For simple Q&A, low memory usage
         "standard": 10,    # Default balanced setting
         "extended": 20,    # For longer conversations
         "comprehensive": 50,  # For complex multi-topic discussions
         "maximum": 100     # For very long context (high memory usage)
-    }
+    })
+    
+    # Token budget presets, same names as above
+    MEMORY_TOKEN_PRESETS = MappingProxyType({
+        "minimal": 512,
+        "standard": 2048,
+        "extended": 4096
+    })
     
     @classmethod
     def get_memory_preset(cls, preset_name: str) -> int:
         """Get memory window size for a preset"""
         return cls.MEMORY_PRESETS.get(preset_name, cls.MEMORY_WINDOW)
     
+    @classmethod
+    def get_memory_token_preset(cls, preset_name: str) -> int:
+        """Get memory token budget for a preset"""
+        return cls.MEMORY_TOKEN_PRESETS.get(preset_name, cls.MEMORY_TOKEN_BUDGET)
+    
     @classmethod
     def get_memory_usage_estimate(cls, memory_window: int) -> str:
         """Estimate memory usage for a given window size"""
-        if memory_window <= 10:
-            return "Low memory usage"
-        elif memory_window <= 30:
-            return "Medium memory usage"
-        elif memory_window <= 60:
-            return "High memory usage"
-        else:
-            return "Very high memory usage" 
\ No newline at end of file
+        return _MEMORY_USAGE_LABELS[bisect_left(_MEMORY_USAGE_THRESHOLDS, memory_window)]
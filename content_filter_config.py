@@ -3,9 +3,40 @@ Content Filter Configuration
 Customize content filtering rules for your specific use case
 """
 
+import re
+import logging
+from types import MappingProxyType
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# The Moderation API accepts up to this many inputs per request
+MODERATION_BATCH_SIZE = 32
+
+# Words that suggest a message is asking about a topic in a learning context
+EDUCATIONAL_INDICATORS = (
+    'learn', 'teach', 'study', 'education', 'course', 'lesson',
+    'academic', 'research', 'science', 'university', 'school'
+)
+
+# Case-insensitive, so the message doesn't need lowercasing first
+_EDU_RE = re.compile('|'.join(map(re.escape, EDUCATIONAL_INDICATORS)), re.IGNORECASE)
+
+def _compile_words(words: frozenset) -> Optional["re.Pattern"]:
+    """Compile literal words into one case-insensitive alternation, longest first (None if empty)"""
+    if not words:
+        return None
+    return re.compile(
+        '|'.join(re.escape(word) for word in sorted(words, key=lambda w: (-len(w), w))),
+        re.IGNORECASE
+    )
+
 class ContentFilterConfig:
     """Configuration for content filtering system"""
     
+    # Settings live on the class; no per-instance state
+    __slots__ = ()
+    
     # ===========================================
     # CONTENT FILTERING SETTINGS
     # ===========================================
@@ -32,14 +63,14 @@ class ContentFilterConfig:
     # ALLOWED FILE TYPES
     # ===========================================
     
-    ALLOWED_FILE_EXTENSIONS = {
+    ALLOWED_FILE_EXTENSIONS = frozenset({
         '.txt',   # Plain text
         '.csv',   # Comma-separated values
         '.md',    # Markdown
         '.json',  # JSON data
         '.pdf',   # PDF documents (if you add PDF support)
         '.docx',  # Word documents (if you add Word support)
-    }
+    })
     
     # ===========================================
     # BLOCKED CONTENT CATEGORIES
@@ -65,35 +96,35 @@ class ContentFilterConfig:
     # ===========================================
     
     # Add your own custom blocked words/phrases
-    CUSTOM_BLOCKED_WORDS = {
+    CUSTOM_BLOCKED_WORDS = frozenset({
         # Add industry-specific terms if needed
         # Example: 'confidential_project_name', 'internal_code_word'
-    }
+    })
     
     # ===========================================
     # BUSINESS-SPECIFIC SETTINGS
     # ===========================================
     
     # Block competitor mentions (add your competitors)
-    BLOCK_COMPETITORS = {
+    BLOCK_COMPETITORS = frozenset({
         # Example: 'competitor_name', 'rival_company'
-    }
+    })
     
     # Block sensitive business topics
-    BLOCK_SENSITIVE_BUSINESS = {
+    BLOCK_SENSITIVE_BUSINESS = frozenset({
         'layoffs', 'downsizing', 'bankruptcy', 'acquisition',
         'merger', 'confidential', 'internal_only'
-    }
+    })
     
     # ===========================================
     # WHITELIST (ALLOWED EXCEPTIONS)
     # ===========================================
     
     # Educational or medical terms that might otherwise be blocked
-    EDUCATIONAL_WHITELIST = {
+    EDUCATIONAL_WHITELIST = frozenset({
         'biology', 'anatomy', 'medical', 'health', 'science',
         'reproduction', 'genetics', 'physiology'
-    }
+    })
     
     # ===========================================
     # LOGGING AND MONITORING
@@ -125,50 +156,113 @@ class ContentFilterConfig:
     # FILTER PRESETS
     # ===========================================
     
-    FILTER_PRESETS = {
-        "strict": {
+    # Read-only so a subclass or caller can't mutate the shared presets
+    FILTER_PRESETS = MappingProxyType({
+        "strict": MappingProxyType({
             "use_openai_moderation": True,
             "block_all_categories": True,
             "custom_word_sensitivity": "high"
-        },
-        "moderate": {
+        }),
+        "moderate": MappingProxyType({
             "use_openai_moderation": True,
             "block_all_categories": True,
             "custom_word_sensitivity": "medium",
             "educational_exceptions": True
-        },
-        "lenient": {
+        }),
+        "lenient": MappingProxyType({
             "use_openai_moderation": True,
             "block_only_explicit": True,
             "custom_word_sensitivity": "low",
             "educational_exceptions": True
-        }
-    }
+        })
+    })
     
     @classmethod
     def get_active_config(cls):
         """Get the active configuration based on filter level"""
         return cls.FILTER_PRESETS.get(cls.FILTER_LEVEL, cls.FILTER_PRESETS["strict"])
     
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Subclasses may override the word sets, so each gets its own matcher
+        cls._compile_blocklists()
+    
+    @classmethod
+    def _compile_blocklists(cls):
+        """Build a single matcher over every blocked-word set"""
+        cls._blocklist_pattern = _compile_words(
+            cls.CUSTOM_BLOCKED_WORDS | cls.BLOCK_COMPETITORS | cls.BLOCK_SENSITIVE_BUSINESS
+        )
+    
+    @classmethod
+    def find_blocked(cls, text: str) -> List[str]:
+        """Blocked words found in text, in order of first appearance"""
+        pattern = cls._blocklist_pattern
+        if pattern is None:
+            return []
+        return list(dict.fromkeys(match.lower() for match in pattern.findall(text)))
+    
+    @classmethod
+    def contains_blocked(cls, text: str) -> bool:
+        """True if text contains any blocked word (stops at the first one)"""
+        pattern = cls._blocklist_pattern
+        return pattern is not None and pattern.search(text) is not None
+    
     @classmethod
     def is_educational_context(cls, text: str) -> bool:
         """Check if text appears to be in educational context"""
-        educational_indicators = [
-            'learn', 'teach', 'study', 'education', 'course', 'lesson',
-            'academic', 'research', 'science', 'university', 'school'
-        ]
-        text_lower = text.lower()
-        return any(indicator in text_lower for indicator in educational_indicators)
+        return _EDU_RE.search(text) is not None
+    
+    @classmethod
+    def filter_batch(cls, messages: List[str], openai_client=None) -> List[Tuple[bool, str]]:
+        """
+        Check many messages at once
+        Local checks run per message; whatever passes goes to the OpenAI
+        Moderation API in batches of MODERATION_BATCH_SIZE instead of one call each
+        Returns: (is_safe, reason_if_blocked) per message, in input order
+        """
+        results = [(True, "")] * len(messages)
+        pending = []
+        for i, message in enumerate(messages):
+            if len(message) > cls.MAX_MESSAGE_LENGTH:
+                results[i] = (False, "Content too long")
+                continue
+            found = cls.find_blocked(message)
+            if found:
+                results[i] = (False, f"Content contains inappropriate material: '{found[0]}'")
+                continue
+            pending.append(i)
+        
+        if not (openai_client and cls.USE_OPENAI_MODERATION):
+            return results
+        
+        for start in range(0, len(pending), MODERATION_BATCH_SIZE):
+            chunk = pending[start:start + MODERATION_BATCH_SIZE]
+            try:
+                moderation = openai_client.moderations.create(input=[messages[i] for i in chunk])
+            except Exception as e:
+                logger.warning("OpenAI batch moderation failed: %s", e)
+                continue
+            for i, result in zip(chunk, moderation.results):
+                if result.flagged:
+                    categories = [cat for cat, flagged in result.categories.__dict__.items() if flagged]
+                    results[i] = (False, f"Content flagged for: {', '.join(categories)}")
+        
+        return results
+
+ContentFilterConfig._compile_blocklists()
 
 # Environment-specific configurations
 class DevelopmentConfig(ContentFilterConfig):
     """Less strict filtering for development/testing"""
+    __slots__ = ()
     FILTER_LEVEL = "lenient"
     LOG_BLOCKED_CONTENT = True
     ALERT_ON_SUSPICIOUS_ACTIVITY = False
 
 class ProductionConfig(ContentFilterConfig):
     """Strict filtering for production environment"""
+    __slots__ = ()
     FILTER_LEVEL = "strict"
     USE_OPENAI_MODERATION = True
     LOG_BLOCKED_CONTENT = True
@@ -176,6 +270,7 @@ class ProductionConfig(ContentFilterConfig):
 
 class EducationConfig(ContentFilterConfig):
     """Balanced filtering for educational institutions"""
+    __slots__ = ()
     FILTER_LEVEL = "moderate"
     USE_OPENAI_MODERATION = True
     
@@ -186,6 +281,7 @@ class EducationConfig(ContentFilterConfig):
 
 class BusinessConfig(ContentFilterConfig):
     """Enterprise-focused filtering"""
+    __slots__ = ()
     FILTER_LEVEL = "strict"
     
     # Additional business-specific blocks
@@ -193,13 +289,15 @@ class BusinessConfig(ContentFilterConfig):
         'confidential', 'proprietary', 'trade_secret', 'internal_only'
     })
 
+# One shared instance per environment, built once at import
+_CONFIGS = MappingProxyType({
+    "development": DevelopmentConfig(),
+    "production": ProductionConfig(),
+    "education": EducationConfig(),
+    "business": BusinessConfig()
+})
+
 # Helper function to get appropriate config
-def get_content_filter_config(environment: str = "production"):
+def get_content_filter_config(environment: str = "production") -> ContentFilterConfig:
     """Get content filter configuration based on environment"""
-    configs = {
-        "development": DevelopmentConfig,
-        "production": ProductionConfig,
-        "education": EducationConfig,
-        "business": BusinessConfig
-    }
-    return configs.get(environment, ProductionConfig) 
\ No newline at end of file
+    return _CONFIGS.get(environment, _CONFIGS["production"])
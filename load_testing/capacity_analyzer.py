@@ -4,13 +4,32 @@ Analyzes system resources and estimates capacity limits
 """
 
 import psutil
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+import os
 import time
 import json
-from typing import Dict, List
+from typing import Dict, List, NamedTuple, Tuple
 import subprocess
 import docker
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Shortest CPU sampling window that still gives a meaningful reading
+MIN_CPU_SAMPLE_SECONDS = 0.1
+
+MEMINFO_PATH = "/proc/meminfo"
+_MEMINFO_KEYS = (b"MemTotal", b"MemAvailable", b"SwapTotal", b"SwapFree")
+
+class MemorySample(NamedTuple):
+    total: int
+    available: int
+    percent: float
+
+class SwapSample(NamedTuple):
+    total: int
+    percent: float
 
 class ChatBotCapacityAnalyzer:
     def __init__(self, base_url="http://localhost:8000"):
@@ -18,18 +37,47 @@ class ChatBotCapacityAnalyzer:
         self.system_info = {}
         self.performance_metrics = {}
         
+        # One keep-alive session for all API probes, so timings don't include
+        # a fresh TCP connection per endpoint
+        self._http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+        self._http.mount("http://", adapter)
+        self._http.mount("https://", adapter)
+        
+        # Docker client, connected lazily by analyze_docker_containers
+        self._docker = None
+        
+        # Static hardware facts, read once
+        self.cpu_count = psutil.cpu_count()
+        self.cpu_freq = psutil.cpu_freq()
+        
+        # /proc/meminfo stays open and is re-read with pread on every sample
+        # (Linux only; elsewhere memory comes from psutil)
+        try:
+            self._meminfo_fd = os.open(MEMINFO_PATH, os.O_RDONLY)
+        except OSError:
+            self._meminfo_fd = None
+        
+        # Prime psutil's CPU counter; later non-blocking reads report usage
+        # since this point instead of sleeping for a fixed interval
+        psutil.cpu_percent(interval=None)
+        self._cpu_primed_at = time.monotonic()
+        
     def analyze_system_resources(self):
         """Analyze current system resources"""
         print("🔍 Analyzing System Resources...")
         
-        # CPU Information
-        cpu_count = psutil.cpu_count()
-        cpu_usage = psutil.cpu_percent(interval=1)
-        cpu_freq = psutil.cpu_freq()
+        # CPU Information (only waits if the counter was primed moments ago)
+        cpu_count = self.cpu_count
+        cpu_freq = self.cpu_freq
+        wait = MIN_CPU_SAMPLE_SECONDS - (time.monotonic() - self._cpu_primed_at)
+        if wait > 0:
+            time.sleep(wait)
+        cpu_usage = psutil.cpu_percent(interval=None)
+        self._cpu_primed_at = time.monotonic()
         
         # Memory Information
-        memory = psutil.virtual_memory()
-        swap = psutil.swap_memory()
+        memory, swap = self._read_memory()
         
         # Disk Information
         disk = psutil.disk_usage('/')
@@ -37,32 +85,31 @@ class ChatBotCapacityAnalyzer:
         # Network Information
         network = psutil.net_io_counters()
         
-        self.system_info = {
-            "cpu": {
-                "cores": cpu_count,
-                "usage_percent": cpu_usage,
-                "frequency_mhz": cpu_freq.current if cpu_freq else "Unknown",
-                "max_frequency_mhz": cpu_freq.max if cpu_freq else "Unknown"
-            },
-            "memory": {
-                "total_gb": round(memory.total / (1024**3), 2),
-                "available_gb": round(memory.available / (1024**3), 2),
-                "used_percent": memory.percent,
-                "swap_total_gb": round(swap.total / (1024**3), 2),
-                "swap_used_percent": swap.percent
-            },
-            "disk": {
-                "total_gb": round(disk.total / (1024**3), 2),
-                "free_gb": round(disk.free / (1024**3), 2),
-                "used_percent": round(disk.used / disk.total * 100, 2)
-            },
-            "network": {
-                "bytes_sent": network.bytes_sent,
-                "bytes_recv": network.bytes_recv,
-                "packets_sent": network.packets_sent,
-                "packets_recv": network.packets_recv
-            }
-        }
+        # Each section dict is created on the first sample and overwritten in
+        # place afterwards, so repeated sampling doesn't rebuild the structure
+        cpu_info = self.system_info.setdefault("cpu", {})
+        cpu_info["cores"] = cpu_count
+        cpu_info["usage_percent"] = cpu_usage
+        cpu_info["frequency_mhz"] = cpu_freq.current if cpu_freq else "Unknown"
+        cpu_info["max_frequency_mhz"] = cpu_freq.max if cpu_freq else "Unknown"
+        
+        memory_info = self.system_info.setdefault("memory", {})
+        memory_info["total_gb"] = round(memory.total / (1024**3), 2)
+        memory_info["available_gb"] = round(memory.available / (1024**3), 2)
+        memory_info["used_percent"] = memory.percent
+        memory_info["swap_total_gb"] = round(swap.total / (1024**3), 2)
+        memory_info["swap_used_percent"] = swap.percent
+        
+        disk_info = self.system_info.setdefault("disk", {})
+        disk_info["total_gb"] = round(disk.total / (1024**3), 2)
+        disk_info["free_gb"] = round(disk.free / (1024**3), 2)
+        disk_info["used_percent"] = round(disk.used / disk.total * 100, 2)
+        
+        network_info = self.system_info.setdefault("network", {})
+        network_info["bytes_sent"] = network.bytes_sent
+        network_info["bytes_recv"] = network.bytes_recv
+        network_info["packets_sent"] = network.packets_sent
+        network_info["packets_recv"] = network.packets_recv
         
         # Display system info
         print(f"💻 System Resources:")
@@ -72,52 +119,101 @@ class ChatBotCapacityAnalyzer:
         
         return self.system_info
     
-    def analyze_docker_containers(self):
+    def _read_memory(self) -> Tuple[MemorySample, SwapSample]:
+        """Read RAM and swap figures with one pread of /proc/meminfo"""
+        if self._meminfo_fd is not None:
+            try:
+                fields = {}
+                for line in os.pread(self._meminfo_fd, 8192, 0).split(b"\n"):
+                    key, _, rest = line.partition(b":")
+                    if key in _MEMINFO_KEYS:
+                        fields[key] = int(rest.split()[0]) * 1024  # values are in kB
+                total, available = fields[b"MemTotal"], fields[b"MemAvailable"]
+                swap_total, swap_free = fields[b"SwapTotal"], fields[b"SwapFree"]
+                return (
+                    MemorySample(total, available, round((total - available) / total * 100, 1)),
+                    SwapSample(swap_total, round((swap_total - swap_free) / swap_total * 100, 1) if swap_total else 0.0)
+                )
+            except (OSError, KeyError, ValueError, IndexError):
+                pass
+        
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        return MemorySample(memory.total, memory.available, memory.percent), SwapSample(swap.total, swap.percent)
+    
+    def analyze_docker_containers(self, verbose=True):
         """Analyze Docker container resource usage"""
-        print("\n🐳 Analyzing Docker Containers...")
+        if verbose:
+            print("\n🐳 Analyzing Docker Containers...")
         
         try:
-            client = docker.from_env()
-            containers = client.containers.list()
+            client = self._get_docker_client()
+            containers = [c for c in client.containers.list() if "chatbot" in c.name.lower()]
             
+            # Each one-shot stats call is a separate daemon round-trip, so
+            # they are issued in parallel
             container_stats = []
-            for container in containers:
-                if "chatbot" in container.name.lower():
-                    stats = container.stats(stream=False)
-                    
-                    # Calculate CPU usage
-                    cpu_delta = stats['cpu_stats']['cpu_usage']['total_usage'] - stats['precpu_stats']['cpu_usage']['total_usage']
-                    system_delta = stats['cpu_stats']['system_cpu_usage'] - stats['precpu_stats']['system_cpu_usage']
-                    cpu_usage = (cpu_delta / system_delta) * len(stats['cpu_stats']['cpu_usage']['percpu_usage']) * 100.0
-                    
-                    # Calculate memory usage
-                    memory_usage = stats['memory_stats']['usage']
-                    memory_limit = stats['memory_stats']['limit']
-                    memory_percent = (memory_usage / memory_limit) * 100.0
-                    
-                    container_info = {
-                        "name": container.name,
-                        "status": container.status,
-                        "cpu_percent": round(cpu_usage, 2),
-                        "memory_usage_mb": round(memory_usage / (1024**2), 2),
-                        "memory_limit_mb": round(memory_limit / (1024**2), 2),
-                        "memory_percent": round(memory_percent, 2)
-                    }
-                    container_stats.append(container_info)
-                    
-                    print(f"   📦 {container.name}:")
-                    print(f"      CPU: {cpu_usage:.1f}%")
-                    print(f"      Memory: {memory_usage / (1024**2):.1f}MB / {memory_limit / (1024**2):.1f}MB ({memory_percent:.1f}%)")
+            if containers:
+                with ThreadPoolExecutor(max_workers=len(containers)) as executor:
+                    samples = list(executor.map(lambda c: c.stats(stream=False), containers))
+                container_stats = self._container_info(containers, samples)
             
+            if verbose:
+                self._print_container_stats(container_stats)
             return container_stats
             
         except Exception as e:
             print(f"   ⚠️  Could not analyze Docker containers: {e}")
             return []
     
-    def test_api_responsiveness(self):
+    def _get_docker_client(self):
+        """Docker client, created on first use and reused afterwards"""
+        if self._docker is None:
+            self._docker = docker.from_env()
+        return self._docker
+    
+    @staticmethod
+    def _container_info(containers, samples):
+        """Turn one stats sample per container into usage figures, computed for all containers at once"""
+        cpu = [s['cpu_stats'] for s in samples]
+        precpu = [s['precpu_stats'] for s in samples]
+        
+        # One column per field, one row per container
+        cpu_delta = np.array([c['cpu_usage']['total_usage'] - p['cpu_usage']['total_usage'] for c, p in zip(cpu, precpu)], dtype=np.float64)
+        system_delta = np.array([c['system_cpu_usage'] - p.get('system_cpu_usage', 0) for c, p in zip(cpu, precpu)], dtype=np.float64)
+        # percpu_usage is absent on cgroup v2 hosts; online_cpus carries the same count
+        cpu_count = np.array([c.get('online_cpus') or len(c['cpu_usage'].get('percpu_usage') or ()) for c in cpu], dtype=np.float64)
+        memory_usage = np.array([s['memory_stats']['usage'] for s in samples], dtype=np.float64)
+        memory_limit = np.array([s['memory_stats']['limit'] for s in samples], dtype=np.float64)
+        
+        # Calculate CPU and memory usage (a container without a previous sample reads 0%)
+        cpu_usage = np.divide(cpu_delta, system_delta, out=np.zeros_like(cpu_delta), where=system_delta > 0) * cpu_count * 100.0
+        memory_percent = memory_usage / memory_limit * 100.0
+        
+        mb = 1024 ** 2
+        return [
+            {
+                "name": container.name,
+                "status": container.status,
+                "cpu_percent": round(float(cpu_usage[i]), 2),
+                "memory_usage_mb": round(float(memory_usage[i] / mb), 2),
+                "memory_limit_mb": round(float(memory_limit[i] / mb), 2),
+                "memory_percent": round(float(memory_percent[i]), 2)
+            }
+            for i, container in enumerate(containers)
+        ]
+    
+    def _print_container_stats(self, container_stats):
+        """Print per-container usage collected by analyze_docker_containers"""
+        for info in container_stats:
+            print(f"   📦 {info['name']}:")
+            print(f"      CPU: {info['cpu_percent']:.1f}%")
+            print(f"      Memory: {info['memory_usage_mb']:.1f}MB / {info['memory_limit_mb']:.1f}MB ({info['memory_percent']:.1f}%)")
+    
+    def test_api_responsiveness(self, verbose=True):
         """Test basic API responsiveness"""
-        print("\n🌐 Testing API Responsiveness...")
+        if verbose:
+            print("\n🌐 Testing API Responsiveness...")
         
         endpoints = [
             ("/", "Root endpoint"),
@@ -125,37 +221,49 @@ class ChatBotCapacityAnalyzer:
             ("/docs", "API documentation")
         ]
         
-        api_results = []
-        for endpoint, description in endpoints:
-            try:
-                start_time = time.time()
-                response = requests.get(f"{self.base_url}{endpoint}", timeout=10)
-                response_time = time.time() - start_time
-                
-                result = {
-                    "endpoint": endpoint,
-                    "description": description,
-                    "status_code": response.status_code,
-                    "response_time": response_time,
-                    "success": response.status_code == 200
-                }
-                api_results.append(result)
-                
-                status = "✅" if response.status_code == 200 else "❌"
-                print(f"   {status} {endpoint}: {response.status_code} ({response_time:.3f}s)")
-                
-            except Exception as e:
-                result = {
-                    "endpoint": endpoint,
-                    "description": description,
-                    "error": str(e),
-                    "success": False
-                }
-                api_results.append(result)
-                print(f"   ❌ {endpoint}: Error - {e}")
+        # Probes are independent, so they run concurrently
+        with ThreadPoolExecutor(max_workers=len(endpoints)) as executor:
+            api_results = list(executor.map(lambda e: self._probe(*e), endpoints))
         
+        if verbose:
+            self._print_api_results(api_results)
         return api_results
     
+    def _probe(self, endpoint, description):
+        """Time one endpoint, including its (small) response body"""
+        try:
+            start_time = time.time()
+            # The body is read in full so the connection goes back to the
+            # session's pool for the next probe instead of being discarded
+            response = self._http.get(f"{self.base_url}{endpoint}", timeout=10)
+            response_time = time.time() - start_time
+            status_code = response.status_code
+            
+            return {
+                "endpoint": endpoint,
+                "description": description,
+                "status_code": status_code,
+                "response_time": response_time,
+                "success": status_code == 200
+            }
+            
+        except Exception as e:
+            return {
+                "endpoint": endpoint,
+                "description": description,
+                "error": str(e),
+                "success": False
+            }
+    
+    def _print_api_results(self, api_results):
+        """Print probe results collected by test_api_responsiveness"""
+        for result in api_results:
+            if "error" in result:
+                print(f"   ❌ {result['endpoint']}: Error - {result['error']}")
+            else:
+                status = "✅" if result["success"] else "❌"
+                print(f"   {status} {result['endpoint']}: {result['status_code']} ({result['response_time']:.3f}s)")
+    
     def estimate_capacity(self):
         """Estimate system capacity based on current resources"""
         print("\n📊 Estimating Capacity...")
@@ -287,14 +395,25 @@ class ChatBotCapacityAnalyzer:
         print("🚀 Starting Complete Capacity Analysis")
         print("=" * 50)
         
-        # Analyze system resources
+        # Analyze system resources first, on its own, so the CPU sample
+        # doesn't count the analyzer's own probes and docker calls as load
         system_info = self.analyze_system_resources()
         
-        # Analyze Docker containers
-        container_stats = self.analyze_docker_containers()
-        
-        # Test API responsiveness
-        api_results = self.test_api_responsiveness()
+        # The Docker stats and API probes are independent network waits, so
+        # they run together; output is printed afterwards so it doesn't interleave
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            containers_future = executor.submit(self.analyze_docker_containers, verbose=False)
+            api_future = executor.submit(self.test_api_responsiveness, verbose=False)
+            
+            # Analyze Docker containers
+            print("\n🐳 Analyzing Docker Containers...")
+            container_stats = containers_future.result()
+            self._print_container_stats(container_stats)
+            
+            # Test API responsiveness
+            print("\n🌐 Testing API Responsiveness...")
+            api_results = api_future.result()
+            self._print_api_results(api_results)
         
         # Estimate capacity
         capacity = self.estimate_capacity()
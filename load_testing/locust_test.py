@@ -3,32 +3,145 @@ Load testing script using Locust for AI ChatBot
 Run with: locust -f locust_test.py --host=http://localhost:8000
 """
 
-from locust import HttpUser, task, between
+from locust import task, between, events
+from locust.contrib.fasthttp import FastHttpUser
+from locust.runners import MasterRunner
+from geventhttpclient.client import HTTPClientPool
 import json
+import logging
+import os
 import random
 import time
+import requests
 
-class ChatBotUser(HttpUser):
+# Per-user progress is logged at INFO, below the default level, so spawning
+# many users doesn't serialize on stdout (LOADTEST_LOG_LEVEL=INFO shows it)
+logger = logging.getLogger("loadtest")
+logger.setLevel(os.getenv("LOADTEST_LOG_LEVEL", "WARNING").upper())
+
+# Message pools are built once at import instead of on every task run
+
+# General chat prompts
+_GENERAL_MESSAGES = (
+    "Hello, how are you?",
+    "What is Python programming?",
+    "Explain machine learning in simple terms",
+    "What's the weather like?",
+    "Tell me a joke",
+    "How does blockchain work?",
+    "What are the benefits of AI?",
+    "Explain quantum computing",
+    "What is cloud computing?",
+    "How do neural networks work?"
+)
+
+# Questions answered from the loaded knowledge base
+_KNOWLEDGE_MESSAGES = (
+    "What services does TechCorp offer?",
+    "What is the company's tech stack?",
+    "Who are the team members?",
+    "What are the recent projects?",
+    "What industries do you serve?",
+    "What is the contact information?",
+    "What are the office hours?",
+    "Do you work with startups?"
+)
+
+# Short follow-ups sent by heavy users
+_QUICK_MESSAGES = (
+    "Yes", "No", "Continue", "Tell me more", "Explain",
+    "What about...", "How so?", "Really?", "Interesting",
+    "Go on"
+)
+
+# Long multi-part prompts for stress testing
+_COMPLEX_QUERIES = (
+    "Explain the differences between supervised, unsupervised, and reinforcement learning in machine learning, including real-world examples and implementation strategies for each approach.",
+    "What are the key architectural patterns in microservices, how do they compare to monolithic architectures, and what are the trade-offs in terms of scalability, maintainability, and deployment complexity?",
+    "Describe the process of implementing a complete CI/CD pipeline with automated testing, security scanning, and deployment strategies across multiple environments.",
+    "How does blockchain technology work at a fundamental level, what are the different consensus mechanisms, and what are the practical applications beyond cryptocurrency?",
+    "Explain the concept of distributed systems, including CAP theorem, eventual consistency, and strategies for handling network partitions and data replication."
+)
+
+# /chat bodies are JSON-encoded once here rather than on every request,
+# compactly, since the long stress-test prompts are sent thousands of times
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+def _chat_bodies(messages, mode):
+    return tuple(json.dumps({"message": message, "mode": mode}, separators=(",", ":")).encode() for message in messages)
+
+_GENERAL_BODIES = _chat_bodies(_GENERAL_MESSAGES, "general")
+_KNOWLEDGE_BODIES = _chat_bodies(_KNOWLEDGE_MESSAGES, "knowledge")
+_QUICK_BODIES = _chat_bodies(_QUICK_MESSAGES, "general")
+_COMPLEX_BODIES = _chat_bodies(_COMPLEX_QUERIES, "general")
+
+def _random_bodies(bodies, batch=1024):
+    """Endless random picks from bodies, sampled a batch at a time per user"""
+    while True:
+        yield from random.choices(bodies, k=batch)
+
+# Every user keeps its connections open between tasks
+_KEEP_ALIVE_HEADERS = {"Connection": "keep-alive", "Keep-Alive": "timeout=75"}
+
+# One connection pool shared by all users of every class, instead of one
+# per user; timeouts live on the pool since it creates the connections
+_SHARED_POOL = HTTPClientPool(concurrency=200, network_timeout=30, connection_timeout=10)
+
+# Responses where the server asked to close the connection; any of these
+# means the next request paid for a fresh TCP handshake
+_closed_connections = 0
+
+@events.request.add_listener
+def _count_closed_connections(response=None, **kwargs):
+    global _closed_connections
+    headers = getattr(response, "headers", None)
+    if headers and headers.get("Connection", "").lower() == "close":
+        _closed_connections += 1
+
+@events.test_stop.add_listener
+def _report_connection_reuse(**kwargs):
+    if _closed_connections:
+        print(f"⚠️ Server closed {_closed_connections} connections - keep-alive is not being honoured")
+    else:
+        print("✅ All connections were kept alive")
+
+# The server holds a single chatbot, so it is initialized once per load
+# generator process when the test starts rather than by every user
+_TEST_API_KEY = "test-api-key-for-load-testing"  # Use a test key
+_chatbot_ready = False
+
+@events.test_start.add_listener
+def _initialize_chatbot(environment, **kwargs):
+    global _chatbot_ready
+    if isinstance(environment.runner, MasterRunner):
+        return  # Only the workers send traffic
+    try:
+        response = requests.post(f"{environment.host}/initialize", json={
+            "api_key": _TEST_API_KEY,
+            "memory_window": 10,
+            "temperature": 0.7
+        }, timeout=60)
+        _chatbot_ready = response.status_code == 200
+        if _chatbot_ready:
+            logger.info("✅ Initialized chatbot")
+        else:
+            logger.warning("❌ Failed to initialize chatbot: %s", response.text)
+    except requests.RequestException as e:
+        logger.warning("❌ Failed to initialize chatbot: %s", e)
+
+# FastHttpUser (geventhttpclient) instead of HttpUser (python-requests), so
+# the load generator's own CPU isn't what limits requests per second
+class ChatBotUser(FastHttpUser):
     wait_time = between(1, 5)  # Wait 1-5 seconds between requests
+    client_pool = _SHARED_POOL
+    default_headers = _KEEP_ALIVE_HEADERS
     
     def on_start(self):
-        """Called when a user starts - initialize chatbot"""
-        self.api_key = "test-api-key-for-load-testing"  # Use a test key
-        self.chatbot_ready = False
+        """Called when a user starts - the chatbot was initialized at test start"""
+        self.chatbot_ready = _chatbot_ready
         self.knowledge_loaded = False
-        
-        # Initialize chatbot
-        response = self.client.post("/initialize", json={
-            "api_key": self.api_key,
-            "memory_window": 10,
-            "temperature": 0.7
-        })
-        
-        if response.status_code == 200:
-            self.chatbot_ready = True
-            print(f"✅ User {self.environment.runner.user_count} initialized chatbot")
-        else:
-            print(f"❌ Failed to initialize chatbot: {response.text}")
+        self._general_bodies = _random_bodies(_GENERAL_BODIES)
+        self._knowledge_bodies = _random_bodies(_KNOWLEDGE_BODIES)
     
     @task(3)
     def chat_general(self):
@@ -36,28 +149,12 @@ class ChatBotUser(HttpUser):
         if not self.chatbot_ready:
             return
             
-        messages = [
-            "Hello, how are you?",
-            "What is Python programming?",
-            "Explain machine learning in simple terms",
-            "What's the weather like?",
-            "Tell me a joke",
-            "How does blockchain work?",
-            "What are the benefits of AI?",
-            "Explain quantum computing",
-            "What is cloud computing?",
-            "How do neural networks work?"
-        ]
-        
-        message = random.choice(messages)
+        body = next(self._general_bodies)
         
-        with self.client.post("/chat", json={
-            "message": message,
-            "mode": "general"
-        }, catch_response=True) as response:
+        with self.client.post("/chat", data=body, headers=_JSON_HEADERS, catch_response=True) as response:
             if response.status_code == 200:
                 data = response.json()
-                response_time = response.elapsed.total_seconds()
+                response_time = response.request_meta["response_time"] / 1000  # ms
                 if response_time > 10:  # Flag slow responses
                     response.failure(f"Response too slow: {response_time:.2f}s")
                 else:
@@ -71,26 +168,12 @@ class ChatBotUser(HttpUser):
         if not self.chatbot_ready:
             return
             
-        knowledge_questions = [
-            "What services does TechCorp offer?",
-            "What is the company's tech stack?",
-            "Who are the team members?",
-            "What are the recent projects?",
-            "What industries do you serve?",
-            "What is the contact information?",
-            "What are the office hours?",
-            "Do you work with startups?"
-        ]
+        body = next(self._knowledge_bodies)
         
-        message = random.choice(knowledge_questions)
-        
-        with self.client.post("/chat", json={
-            "message": message,
-            "mode": "knowledge"
-        }, catch_response=True) as response:
+        with self.client.post("/chat", data=body, headers=_JSON_HEADERS, catch_response=True) as response:
             if response.status_code == 200:
                 data = response.json()
-                response_time = response.elapsed.total_seconds()
+                response_time = response.request_meta["response_time"] / 1000  # ms
                 if response_time > 15:  # Knowledge queries can be slower
                     response.failure(f"Knowledge response too slow: {response_time:.2f}s")
                 else:
@@ -124,18 +207,15 @@ class ChatBotUser(HttpUser):
         if self.chatbot_ready:
             self.client.post("/clear-memory")
 
-class HighVolumeUser(HttpUser):
+class HighVolumeUser(FastHttpUser):
     """Simulates heavy users who chat a lot"""
     wait_time = between(0.5, 2)  # Faster interaction
+    client_pool = _SHARED_POOL
+    default_headers = _KEEP_ALIVE_HEADERS
     
     def on_start(self):
-        self.api_key = "heavy-user-test-key"
-        response = self.client.post("/initialize", json={
-            "api_key": self.api_key,
-            "memory_window": 20,  # Larger memory for heavy users
-            "temperature": 0.8
-        })
-        self.chatbot_ready = response.status_code == 200
+        self.chatbot_ready = _chatbot_ready
+        self._bodies = _random_bodies(_QUICK_BODIES)
     
     @task(5)
     def rapid_chat(self):
@@ -143,30 +223,17 @@ class HighVolumeUser(HttpUser):
         if not self.chatbot_ready:
             return
             
-        quick_messages = [
-            "Yes", "No", "Continue", "Tell me more", "Explain",
-            "What about...", "How so?", "Really?", "Interesting",
-            "Go on"
-        ]
-        
-        message = random.choice(quick_messages)
-        self.client.post("/chat", json={
-            "message": message,
-            "mode": "general"
-        })
+        self.client.post("/chat", data=next(self._bodies), headers=_JSON_HEADERS)
 
-class StressTestUser(HttpUser):
+class StressTestUser(FastHttpUser):
     """Simulates stress testing with complex queries"""
     wait_time = between(0.1, 1)  # Very aggressive
+    client_pool = _SHARED_POOL
+    default_headers = _KEEP_ALIVE_HEADERS
     
     def on_start(self):
-        self.api_key = "stress-test-key"
-        response = self.client.post("/initialize", json={
-            "api_key": self.api_key,
-            "memory_window": 50,  # Maximum memory
-            "temperature": 1.0
-        })
-        self.chatbot_ready = response.status_code == 200
+        self.chatbot_ready = _chatbot_ready
+        self._bodies = _random_bodies(_COMPLEX_BODIES)
     
     @task
     def complex_query(self):
@@ -174,16 +241,4 @@ class StressTestUser(HttpUser):
         if not self.chatbot_ready:
             return
             
-        complex_queries = [
-            "Explain the differences between supervised, unsupervised, and reinforcement learning in machine learning, including real-world examples and implementation strategies for each approach.",
-            "What are the key architectural patterns in microservices, how do they compare to monolithic architectures, and what are the trade-offs in terms of scalability, maintainability, and deployment complexity?",
-            "Describe the process of implementing a complete CI/CD pipeline with automated testing, security scanning, and deployment strategies across multiple environments.",
-            "How does blockchain technology work at a fundamental level, what are the different consensus mechanisms, and what are the practical applications beyond cryptocurrency?",
-            "Explain the concept of distributed systems, including CAP theorem, eventual consistency, and strategies for handling network partitions and data replication."
-        ]
-        
-        message = random.choice(complex_queries)
-        self.client.post("/chat", json={
-            "message": message,
-            "mode": "general"
-        }) 
\ No newline at end of file
+        self.client.post("/chat", data=next(self._bodies), headers=_JSON_HEADERS) 
\ No newline at end of file
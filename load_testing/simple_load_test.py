@@ -1,40 +1,197 @@
 """
 Simple load testing script for AI ChatBot
-Run with: python simple_load_test.py
+Run with: python simple_load_test.py [--procs N]
 """
 
 import asyncio
 import aiohttp
+import logging
+import multiprocessing
+import os
+import sys
 import time
 import json
 import random
-from concurrent.futures import ThreadPoolExecutor
-import statistics
+from collections import Counter
+from functools import lru_cache
+import numpy as np
+
+try:
+    import uvloop
+except ImportError:  # Not installed, or not supported (Windows)
+    uvloop = None
+
+# Per-user progress goes through logging (quiet by default) so 1000 users
+# don't contend on stdout mid-run; only the summary is printed.
+# Set LOADTEST_LOG_LEVEL=INFO to see it.
+logger = logging.getLogger("loadtest")
+logger.setLevel(os.getenv("LOADTEST_LOG_LEVEL", "WARNING").upper())
+
+# Prompts each simulated user picks from, built once at import
+_CHAT_MESSAGES = (
+    "Hello, how are you?",
+    "What is artificial intelligence?",
+    "Explain machine learning",
+    "Tell me about Python programming",
+    "What are neural networks?",
+    "How does natural language processing work?",
+    "What is the difference between AI and ML?",
+    "Explain deep learning concepts",
+    "What are the applications of AI?",
+    "How do chatbots work?"
+)
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+def _random_messages(pool, batch=1024):
+    """Endless random picks from pool, sampled a batch at a time"""
+    while True:
+        yield from random.choices(pool, k=batch)
+
+@lru_cache(maxsize=None)
+def _chat_body(message, mode):
+    """JSON body for a /chat request, encoded once per (message, mode)"""
+    return json.dumps({"message": message, "mode": mode}, separators=(",", ":")).encode()
+
+class LatencyStats:
+    """
+    Running request counters, updated as each result arrives
+    Percentiles come from a fixed-size reservoir sample of successful response
+    times, so memory stays constant however many requests a run sends
+    """
+    
+    def __init__(self, reservoir_size=100_000):
+        self.total = 0
+        self.successes = 0
+        self.response_time_sum = 0.0
+        self.min_response_time = float("inf")
+        self.max_response_time = 0.0
+        self.fast = 0      # < 2s
+        self.medium = 0    # 2-5s
+        self.slow = 0      # >= 5s
+        self.errors = Counter()
+        self.user_ids = set()
+        self._reservoir = np.empty(reservoir_size, dtype=np.float64)
+        self._filled = 0
+    
+    def record(self, result, user_id):
+        """Fold one request result into the running totals"""
+        self.total += 1
+        self.user_ids.add(user_id)
+        if not result.get("success", False):
+            self.errors[result.get("error", "Unknown")] += 1
+            return
+        
+        rt = result["response_time"]
+        self.successes += 1
+        self.response_time_sum += rt
+        self.min_response_time = min(self.min_response_time, rt)
+        self.max_response_time = max(self.max_response_time, rt)
+        if rt < 2:
+            self.fast += 1
+        elif rt < 5:
+            self.medium += 1
+        else:
+            self.slow += 1
+        
+        # Reservoir sampling: every success has an equal chance of being kept
+        if self._filled < len(self._reservoir):
+            self._reservoir[self._filled] = rt
+            self._filled += 1
+        else:
+            slot = random.randrange(self.successes)
+            if slot < len(self._reservoir):
+                self._reservoir[slot] = rt
+    
+    @property
+    def failures(self):
+        return self.total - self.successes
+    
+    @property
+    def mean(self):
+        return self.response_time_sum / self.successes
+    
+    def percentiles(self, *ps):
+        """Response time percentiles over the sampled successes, from a single sort"""
+        return np.percentile(self._reservoir[:self._filled], ps).tolist()
+    
+    def merge(self, other):
+        """Fold another process's stats into these ones"""
+        successes = self.successes + other.successes
+        self.total += other.total
+        self.response_time_sum += other.response_time_sum
+        self.min_response_time = min(self.min_response_time, other.min_response_time)
+        self.max_response_time = max(self.max_response_time, other.max_response_time)
+        self.fast += other.fast
+        self.medium += other.medium
+        self.slow += other.slow
+        self.errors.update(other.errors)
+        self.user_ids |= other.user_ids
+        
+        # Keep each side's samples in proportion to the successes they stand for
+        mine = self._reservoir[:self._filled]
+        theirs = other._reservoir[:other._filled]
+        size = len(self._reservoir)
+        if len(mine) + len(theirs) > size:
+            keep = round(size * self.successes / successes)
+            mine = np.random.choice(mine, min(keep, len(mine)), replace=False)
+            theirs = np.random.choice(theirs, min(size - len(mine), len(theirs)), replace=False)
+        samples = np.concatenate([mine, theirs])
+        self._reservoir[:len(samples)] = samples
+        self._filled = len(samples)
+        self.successes = successes
 
 class SimpleChatBotLoadTest:
-    def __init__(self, base_url="http://localhost:8000"):
+    def __init__(self, base_url="http://localhost:8000", limit=1000, limit_per_host=0):
+        """
+        limit / limit_per_host: connection pool caps for the shared aiohttp
+        session (0 = no per-host cap beyond limit)
+        """
         self.base_url = base_url
         self.test_api_key = "test-load-testing-key"
-        self.results = []
+        self.stats = LatencyStats()
+        self.limit = limit
+        self.limit_per_host = limit_per_host
         
-    async def initialize_chatbot(self, session):
-        """Initialize a chatbot instance"""
-        try:
-            async with session.post(f"{self.base_url}/initialize", 
-                                  json={"api_key": self.test_api_key}) as response:
-                return response.status == 200
-        except Exception as e:
-            print(f"❌ Initialization failed: {e}")
-            return False
+        # One session for every run, created on first use inside the event loop
+        self._session = None
+        
+        # Caps requests in flight at once; set per run by run_load_test
+        self._in_flight = None
+    
+    async def _get_session(self):
+        """Shared aiohttp session, built on first use"""
+        if self._session is None or self._session.closed:
+            # The default connector caps the pool at 100 connections; size it
+            # for the simulated users so requests reuse keep-alive connections
+            # instead of queueing or re-handshaking on the client side
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=75,
+                enable_cleanup_closed=True,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+        return self._session
     
-    async def send_chat_message(self, session, message, mode="general"):
+    async def aclose(self):
+        """Close the shared session once all runs are done"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        
+    async def send_chat_message(self, message, mode="general"):
         """Send a chat message and measure response time"""
-        start_time = time.time()
+        # Monotonic, high-resolution clock: immune to wall-clock (NTP) jumps
+        start_ns = time.perf_counter_ns()
         try:
-            async with session.post(f"{self.base_url}/chat", 
-                                  json={"message": message, "mode": mode}) as response:
-                end_time = time.time()
-                response_time = end_time - start_time
+            async with self._session.post(f"{self.base_url}/chat", 
+                                  data=_chat_body(message, mode), headers=_JSON_HEADERS) as response:
+                response_time = (time.perf_counter_ns() - start_ns) * 1e-9
                 
                 if response.status == 200:
                     data = await response.json()
@@ -53,89 +210,111 @@ class SimpleChatBotLoadTest:
                         "error": f"HTTP {response.status}"
                     }
         except Exception as e:
-            end_time = time.time()
             return {
                 "success": False,
-                "response_time": end_time - start_time,
+                "response_time": (time.perf_counter_ns() - start_ns) * 1e-9,
                 "error": str(e)
             }
     
-    async def simulate_user(self, session, user_id, num_messages=5):
-        """Simulate a single user's chat session"""
-        print(f"👤 User {user_id} starting...")
+    async def simulate_user(self, user_id, num_messages=5, deadline=None):
+        """
+        Simulate a single user's chat session
+        deadline: event loop time to keep chatting until (endurance mode);
+        num_messages is ignored when it is set
+        """
+        logger.info("👤 User %d starting...", user_id)
         
         # Initialize chatbot
-        if not await self.initialize_chatbot(session):
-            print(f"❌ User {user_id} failed to initialize")
-            return []
-        
-        messages = [
-            "Hello, how are you?",
-            "What is artificial intelligence?",
-            "Explain machine learning",
-            "Tell me about Python programming",
-            "What are neural networks?",
-            "How does natural language processing work?",
-            "What is the difference between AI and ML?",
-            "Explain deep learning concepts",
-            "What are the applications of AI?",
-            "How do chatbots work?"
-        ]
+        try:
+            async with self._session.post(f"{self.base_url}/initialize", 
+                                  json={"api_key": self.test_api_key}) as response:
+                response.raise_for_status()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning("❌ User %d failed to initialize: %s", user_id, e)
+            return
         
-        user_results = []
-        for i in range(num_messages):
-            message = random.choice(messages)
-            result = await self.send_chat_message(session, message)
-            result["user_id"] = user_id
-            result["message_number"] = i + 1
-            user_results.append(result)
+        loop = asyncio.get_running_loop()
+        messages = _random_messages(_CHAT_MESSAGES, min(num_messages, 1024) if deadline is None else 1024)
+        sent = 0
+        while (loop.time() < deadline) if deadline is not None else (sent < num_messages):
+            sent += 1
+            message = next(messages)
+            async with self._in_flight:
+                result = await self.send_chat_message(message)
+            self.stats.record(result, user_id)
             
             # Wait between messages (simulate human typing)
             await asyncio.sleep(random.uniform(1, 3))
         
-        print(f"✅ User {user_id} completed {num_messages} messages")
-        return user_results
+        logger.info("✅ User %d completed %d messages", user_id, sent)
     
-    async def run_load_test(self, concurrent_users=10, messages_per_user=5):
-        """Run the load test with specified parameters"""
+    async def run_load_test(self, concurrent_users=10, messages_per_user=5, max_in_flight=None,
+                            duration=None, first_user_id=0, report=True):
+        """
+        Run the load test with specified parameters
+        max_in_flight: most chat requests outstanding at once (defaults to the
+        connection pool limit, so requests never queue inside the connector)
+        duration: seconds to keep every user chatting (endurance mode) instead
+        of a fixed number of messages; results are aggregated as they arrive,
+        so memory use does not grow with the length of the run
+        first_user_id / report: used by multi-process runs, where each worker
+        simulates a slice of the users and the parent prints the merged report
+        """
+        if not report:
+            return await self._run_users(concurrent_users, messages_per_user, max_in_flight,
+                                         duration, first_user_id)
+        
         print(f"🚀 Starting load test:")
         print(f"   Concurrent Users: {concurrent_users}")
-        print(f"   Messages per User: {messages_per_user}")
-        print(f"   Total Messages: {concurrent_users * messages_per_user}")
+        if duration is None:
+            print(f"   Messages per User: {messages_per_user}")
+            print(f"   Total Messages: {concurrent_users * messages_per_user}")
+        else:
+            print(f"   Duration: {duration / 60:.0f} minutes")
         print(f"   Target: {self.base_url}")
         print("-" * 50)
         
-        start_time = time.time()
+        start_time = time.perf_counter()
         
-        async with aiohttp.ClientSession() as session:
-            # Create tasks for all users
-            tasks = []
-            for user_id in range(concurrent_users):
-                task = self.simulate_user(session, user_id, messages_per_user)
-                tasks.append(task)
-            
-            # Run all users concurrently
-            user_results = await asyncio.gather(*tasks)
-            
-            # Flatten results
-            for user_result in user_results:
-                self.results.extend(user_result)
+        await self._run_users(concurrent_users, messages_per_user, max_in_flight,
+                              duration, first_user_id)
         
-        end_time = time.time()
-        total_time = end_time - start_time
+        total_time = time.perf_counter() - start_time
         
         # Analyze results
         self.analyze_results(total_time)
     
+    async def _run_users(self, concurrent_users, messages_per_user, max_in_flight, duration,
+                         first_user_id):
+        """Run every simulated user to completion, recording into self.stats"""
+        await self._get_session()
+        
+        self._in_flight = asyncio.Semaphore(max_in_flight or self.limit or concurrent_users)
+        
+        deadline = asyncio.get_running_loop().time() + duration if duration is not None else None
+        
+        # Create tasks for all users
+        tasks = []
+        for user_id in range(first_user_id, first_user_id + concurrent_users):
+            task = self.simulate_user(user_id, messages_per_user, deadline)
+            tasks.append(task)
+        
+        # Run all users concurrently; each records into self.stats as it goes,
+        # and finished users are released as they complete
+        for finished in asyncio.as_completed(tasks):
+            await finished
+    
     def analyze_results(self, total_time):
         """Analyze and display test results"""
         print("\n📊 LOAD TEST RESULTS")
         print("=" * 50)
         
+        stats = self.stats
+        
         # Basic stats
-        total_requests = len(self.results)
-        successful_requests = sum(1 for r in self.results if r.get("success", False))
-        failed_requests = total_requests - successful_requests
+        total_requests = stats.total
+        successful_requests = stats.successes
+        failed_requests = stats.failures
         
         success_rate = (successful_requests / total_requests * 100) if total_requests > 0 else 0
         
@@ -148,35 +327,25 @@ class SimpleChatBotLoadTest:
         
         # Response time analysis
         if successful_requests > 0:
-            response_times = [r["response_time"] for r in self.results if r.get("success", False)]
+            median, p95 = stats.percentiles(50, 95)
             
             print(f"\n⏱️  Response Time Analysis:")
-            print(f"   Average: {statistics.mean(response_times):.2f}s")
-            print(f"   Median: {statistics.median(response_times):.2f}s")
-            print(f"   Min: {min(response_times):.2f}s")
-            print(f"   Max: {max(response_times):.2f}s")
-            print(f"   95th Percentile: {self.percentile(response_times, 95):.2f}s")
+            print(f"   Average: {stats.mean:.2f}s")
+            print(f"   Median: {median:.2f}s")
+            print(f"   Min: {stats.min_response_time:.2f}s")
+            print(f"   Max: {stats.max_response_time:.2f}s")
+            print(f"   95th Percentile: {p95:.2f}s")
             
             # Performance categories
-            fast_responses = sum(1 for rt in response_times if rt < 2)
-            medium_responses = sum(1 for rt in response_times if 2 <= rt < 5)
-            slow_responses = sum(1 for rt in response_times if rt >= 5)
-            
             print(f"\n📊 Response Time Distribution:")
-            print(f"   Fast (<2s): {fast_responses} ({fast_responses/len(response_times)*100:.1f}%)")
-            print(f"   Medium (2-5s): {medium_responses} ({medium_responses/len(response_times)*100:.1f}%)")
-            print(f"   Slow (≥5s): {slow_responses} ({slow_responses/len(response_times)*100:.1f}%)")
+            print(f"   Fast (<2s): {stats.fast} ({stats.fast/successful_requests*100:.1f}%)")
+            print(f"   Medium (2-5s): {stats.medium} ({stats.medium/successful_requests*100:.1f}%)")
+            print(f"   Slow (≥5s): {stats.slow} ({stats.slow/successful_requests*100:.1f}%)")
         
         # Error analysis
         if failed_requests > 0:
             print(f"\n❌ Error Analysis:")
-            error_types = {}
-            for result in self.results:
-                if not result.get("success", False):
-                    error = result.get("error", "Unknown")
-                    error_types[error] = error_types.get(error, 0) + 1
-            
-            for error, count in error_types.items():
+            for error, count in stats.errors.items():
                 print(f"   {error}: {count}")
         
         # Recommendations
@@ -184,7 +353,7 @@ class SimpleChatBotLoadTest:
         if success_rate < 95:
             print("   ⚠️  Success rate is low - check server capacity")
         if successful_requests > 0:
-            avg_response_time = statistics.mean([r["response_time"] for r in self.results if r.get("success", False)])
+            avg_response_time = stats.mean
             if avg_response_time > 5:
                 print("   ⚠️  Average response time is high - consider scaling")
             elif avg_response_time < 2:
@@ -194,7 +363,7 @@ class SimpleChatBotLoadTest:
         
         # Capacity estimation
         if success_rate > 95:
-            concurrent_capacity = len(set(r.get("user_id") for r in self.results))
+            concurrent_capacity = len(stats.user_ids)
             requests_per_second = total_requests / total_time
             
             print(f"\n🎯 Current Capacity Estimate:")
@@ -210,20 +379,60 @@ class SimpleChatBotLoadTest:
             else:
                 print("   📊 Scale: Good for large applications (5000+ users/day)")
 
-    def percentile(self, data, p):
-        """Calculate percentile"""
-        sorted_data = sorted(data)
-        index = (len(sorted_data) - 1) * p / 100
-        lower = int(index)
-        upper = lower + 1
-        weight = index - lower
-        
-        if upper >= len(sorted_data):
-            return sorted_data[-1]
-        return sorted_data[lower] * (1 - weight) + sorted_data[upper] * weight
+def _run_worker(base_url, users, messages, duration, first_user_id, results):
+    """Entry point for one load generator process; sends its stats back on results"""
+    tester = SimpleChatBotLoadTest(base_url)
+    
+    async def run():
+        try:
+            await tester.run_load_test(concurrent_users=users, messages_per_user=messages,
+                                       duration=duration, first_user_id=first_user_id,
+                                       report=False)
+        finally:
+            await tester.aclose()
+    
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    asyncio.run(run())
+    results.put(tester.stats)
+
+def run_multiprocess(tester, users, messages, duration, procs):
+    """
+    Split the users across procs generator processes, so a single process's
+    GIL (mostly spent parsing responses) doesn't cap the load we can offer
+    """
+    print(f"🚀 Starting load test across {procs} processes:")
+    print(f"   Concurrent Users: {users}")
+    print(f"   Target: {tester.base_url}")
+    print("-" * 50)
+    
+    start_time = time.perf_counter()
+    
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    workers = []
+    first_user_id = 0
+    for i in range(procs):
+        share = users // procs + (1 if i < users % procs else 0)
+        worker = ctx.Process(target=_run_worker,
+                             args=(tester.base_url, share, messages, duration, first_user_id, results))
+        worker.start()
+        workers.append(worker)
+        first_user_id += share
+    
+    # Drain the queue before joining, or workers block flushing large results
+    for _ in workers:
+        tester.stats.merge(results.get())
+    for worker in workers:
+        worker.join()
+    
+    tester.analyze_results(time.perf_counter() - start_time)
 
 def main():
-    """Run different load test scenarios"""
+    """
+    Run different load test scenarios
+    Pass --procs N to spread the simulated users over N processes
+    """
     tester = SimpleChatBotLoadTest()
     
     print("🧪 AI ChatBot Load Testing Suite")
@@ -233,24 +442,49 @@ def main():
     print("3. Heavy Load (20 users, 5 messages each)")
     print("4. Stress Test (50 users, 3 messages each)")
     print("5. Custom Test")
+    print("6. Endurance Test (fixed users for a set number of minutes)")
     
-    choice = input("Enter choice (1-5): ").strip()
+    choice = input("Enter choice (1-6): ").strip()
     
-    if choice == "1":
-        asyncio.run(tester.run_load_test(concurrent_users=5, messages_per_user=3))
-    elif choice == "2":
-        asyncio.run(tester.run_load_test(concurrent_users=10, messages_per_user=5))
-    elif choice == "3":
-        asyncio.run(tester.run_load_test(concurrent_users=20, messages_per_user=5))
-    elif choice == "4":
-        asyncio.run(tester.run_load_test(concurrent_users=50, messages_per_user=3))
+    duration = None
+    scenarios = {
+        "1": (5, 3),
+        "2": (10, 5),
+        "3": (20, 5),
+        "4": (50, 3)
+    }
+    if choice in scenarios:
+        users, messages = scenarios[choice]
     elif choice == "5":
         users = int(input("Number of concurrent users: "))
         messages = int(input("Messages per user: "))
-        asyncio.run(tester.run_load_test(concurrent_users=users, messages_per_user=messages))
+    elif choice == "6":
+        users = int(input("Number of concurrent users: "))
+        duration = float(input("Duration in minutes: ")) * 60
+        messages = 0
     else:
         print("Invalid choice. Running default test...")
-        asyncio.run(tester.run_load_test(concurrent_users=10, messages_per_user=5))
+        users, messages = 10, 5
+    
+    logging.basicConfig(format="%(message)s")
+    
+    procs = int(sys.argv[sys.argv.index("--procs") + 1]) if "--procs" in sys.argv else 1
+    if procs > 1:
+        run_multiprocess(tester, users, messages, duration, procs)
+        return
+    
+    # libuv-based loop: less scheduling overhead across many open sockets
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    asyncio.run(run_and_close(tester, users, messages, duration))
+
+async def run_and_close(tester, users, messages, duration=None):
+    """Run a load test, then close the tester's shared session"""
+    try:
+        await tester.run_load_test(concurrent_users=users, messages_per_user=messages,
+                                   duration=duration)
+    finally:
+        await tester.aclose()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -22,8 +22,32 @@ def check_environment():
         print("source venv/bin/activate && pip install -r requirements.txt")
         return False
 
+def uvicorn_command(production: bool):
+    """Build the uvicorn command line for dev (auto-reload) or production use."""
+    command = [
+        sys.executable, "-m", "uvicorn",
+        "backend.server:app",
+        "--host", "0.0.0.0",
+        "--port", "8000"
+    ]
+    if not production:
+        return command + ["--reload"]
+    
+    # uvloop (when installed; "auto" falls back on Windows), httptools and no
+    # per-request access log line, so load tests measure the app rather than
+    # the dev setup. WEB_CONCURRENCY workers, 1 by default: chatbot memory and the
+    # knowledge base live in each worker, so more than one worker needs Redis
+    # (to share /initialize settings) and sticky sessions in front
+    workers = os.getenv("WEB_CONCURRENCY", "1")
+    return command + [
+        "--workers", workers,
+        "--loop", "auto",
+        "--http", "httptools",
+        "--no-access-log"
+    ]
+
 def start_server():
-    """Start the FastAPI server."""
+    """Start the FastAPI server (pass --prod for a no-reload server with WEB_CONCURRENCY workers)."""
     if not check_environment():
         sys.exit(1)
     
@@ -38,13 +62,7 @@ def start_server():
         os.chdir(Path(__file__).parent)
         
         # Start the server
-        subprocess.run([
-            sys.executable, "-m", "uvicorn", 
-            "backend.server:app", 
-            "--host", "0.0.0.0", 
-            "--port", "8000", 
-            "--reload"
-        ])
+        subprocess.run(uvicorn_command(production="--prod" in sys.argv[1:]))
     except KeyboardInterrupt:
         print("\n🛑 Server stopped by user")
     except Exception as e:
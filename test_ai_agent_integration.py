@@ -4,7 +4,8 @@ Test script for AI Agent integration in ChatBot
 Comprehensive testing of intelligent multi-step problem solving
 """
 
-import requests
+import aiohttp
+import asyncio
 import json
 import os
 from datetime import datetime
@@ -14,26 +15,28 @@ import time
 BASE_URL = "http://localhost:8000"
 TEST_API_KEY = os.getenv("OPENAI_API_KEY", "your-test-api-key-here")
 
-def test_api_endpoint(endpoint, method="GET", data=None):
+async def test_api_endpoint(session, endpoint, method="GET", data=None):
     """Test an API endpoint and return the response"""
     url = f"{BASE_URL}{endpoint}"
+    # Longer timeout for agent processing
+    timeout = aiohttp.ClientTimeout(total=30 if method == "GET" else 60)
     
     try:
-        if method == "GET":
-            response = requests.get(url, timeout=30)
-        elif method == "POST":
-            response = requests.post(url, json=data, timeout=60)  # Longer timeout for agent processing
+        async with session.request(method, url, json=data, timeout=timeout) as response:
+            if response.status == 200:
+                result = await response.json()
+            else:
+                error = await response.text()
         
         print(f"\n{'='*80}")
         print(f"Testing: {method} {endpoint}")
-        print(f"Status: {response.status_code}")
+        print(f"Status: {response.status}")
         
-        if response.status_code == 200:
-            result = response.json()
+        if response.status == 200:
             print(f"✅ Success!")
             return result
         else:
-            print(f"❌ Failed: {response.text}")
+            print(f"❌ Failed: {error}")
             return None
             
     except Exception as e:
@@ -73,9 +76,14 @@ def print_agent_response(response, scenario_name):
     else:
         print(f"   {agent_response}")
 
-def main():
+async def main():
     """Run comprehensive AI Agent testing"""
-    
+    # One session for every request, so connections are reused across tests
+    async with aiohttp.ClientSession() as session:
+        await run_tests(session)
+
+async def run_tests(session):
+    """Run each test in turn against the server"""
     print("🤖 AI Agent-Enhanced ChatBot Integration Test")
     print("=" * 80)
     print(f"Base URL: {BASE_URL}")
@@ -85,7 +93,7 @@ def main():
     # Test 1: Check if server is running
     print("\n" + "="*80)
     print("TEST 1: Server Status & Features")
-    root_response = test_api_endpoint("/")
+    root_response = await test_api_endpoint(session, "/")
     
     if not root_response:
         print("❌ Server is not running. Please start the server with:")
@@ -105,7 +113,7 @@ def main():
         "temperature": 0.7
     }
     
-    init_response = test_api_endpoint("/initialize", "POST", init_data)
+    init_response = await test_api_endpoint(session, "/initialize", "POST", init_data)
     
     if not init_response or not init_response.get("success"):
         print("❌ Failed to initialize chatbot. Check your OpenAI API key.")
@@ -119,7 +127,7 @@ def main():
     print("\n" + "="*80)
     print("TEST 3: Available AI Agents")
     
-    agents_response = test_api_endpoint("/agents/available")
+    agents_response = await test_api_endpoint(session, "/agents/available")
     
     if agents_response:
         agents = agents_response.get("agents", [])
@@ -138,20 +146,20 @@ def main():
     print(f"\n📝 Test Message: {test_message}")
     
     standard_data = {"message": test_message, "session_id": "comparison_test"}
-    standard_response = test_api_endpoint("/chat", "POST", standard_data)
+    standard_response = await test_api_endpoint(session, "/chat", "POST", standard_data)
     if standard_response:
         print(f"\n🔵 Standard Chat: {standard_response.get('response', 'No response')[:150]}...")
     
     # Test enhanced chat (MCP tools)
     enhanced_data = {"message": test_message, "session_id": "comparison_test"}
-    enhanced_response = test_api_endpoint("/chat/enhanced", "POST", enhanced_data)
+    enhanced_response = await test_api_endpoint(session, "/chat/enhanced", "POST", enhanced_data)
     if enhanced_response:
         print(f"\n🟡 Enhanced Chat (MCP): Enhanced={enhanced_response.get('enhanced', False)}, Tools={enhanced_response.get('tools_used', [])}")
         print(f"   Response: {enhanced_response.get('response', '')[:150]}...")
     
     # Test agent chat (AI Agent)
     agent_data = {"message": test_message, "session_id": "comparison_test"}
-    agent_response = test_api_endpoint("/chat/agent", "POST", agent_data)
+    agent_response = await test_api_endpoint(session, "/chat/agent", "POST", agent_data)
     if agent_response:
         print(f"\n🟢 AI Agent Chat: Agent={agent_response.get('agent_role', 'N/A')}, Steps={agent_response.get('steps_completed', 0)}")
         print(f"   Response: {agent_response.get('response', '')[:150]}...")
@@ -188,6 +196,8 @@ def main():
         }
     ]
     
+    # Run one at a time: the server's agent memory is shared across
+    # session_ids, so parallel scenarios could sway each other's agent choice
     for i, scenario in enumerate(business_scenarios, 1):
         print(f"\n{'='*60}")
         print(f"Business Scenario {i}: {scenario['name']}")
@@ -199,9 +209,9 @@ def main():
             "use_agent": True
         }
         
-        start_time = time.time()
-        response = test_api_endpoint("/chat/agent", "POST", agent_data)
-        end_time = time.time()
+        start_time = time.perf_counter()
+        response = await test_api_endpoint(session, "/chat/agent", "POST", agent_data)
+        elapsed = time.perf_counter() - start_time
         
         if response:
             print_agent_response(response, scenario['name'])
@@ -215,16 +225,13 @@ def main():
             else:
                 print(f"⚠️ Agent mismatch - Expected: {expected_agent}, Got: {actual_agent}")
             
-            print(f"⏱️ Total response time: {end_time - start_time:.2f} seconds")
-        
-        # Brief pause between tests
-        time.sleep(2)
+            print(f"⏱️ Total response time: {elapsed:.2f} seconds")
     
     # Test 6: Agent performance statistics
     print("\n" + "="*80)
     print("TEST 6: Agent Performance Statistics")
     
-    stats_response = test_api_endpoint("/agents/stats")
+    stats_response = await test_api_endpoint(session, "/agents/stats")
     
     if stats_response:
         agent_stats = stats_response.get("agent_stats", {})
@@ -263,7 +270,7 @@ def main():
             "use_agent": True
         }
         
-        response = test_api_endpoint("/chat/agent", "POST", agent_data)
+        response = await test_api_endpoint(session, "/chat/agent", "POST", agent_data)
         
         if response:
             agent_used = response.get('agent_used', False)
@@ -317,4 +324,4 @@ def main():
     print("   From simple Q&A to complex business process automation! 🎊")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
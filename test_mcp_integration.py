@@ -6,6 +6,7 @@ Run this to verify that the enhanced chatbot with MCP tools is working
 
 import asyncio
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
 from datetime import datetime
@@ -14,15 +15,19 @@ from datetime import datetime
 BASE_URL = "http://localhost:8000"
 TEST_API_KEY = os.getenv("OPENAI_API_KEY", "your-test-api-key-here")
 
+# One session for every call, so requests reuse keep-alive connections
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
 def test_api_endpoint(endpoint, method="GET", data=None):
     """Test an API endpoint and return the response"""
     url = f"{BASE_URL}{endpoint}"
     
     try:
         if method == "GET":
-            response = requests.get(url, timeout=10)
+            response = SESSION.get(url, timeout=10)
         elif method == "POST":
-            response = requests.post(url, json=data, timeout=30)
+            response = SESSION.post(url, json=data, timeout=30)
         
         print(f"\n{'='*60}")
         print(f"Testing: {method} {endpoint}")